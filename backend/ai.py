@@ -0,0 +1,182 @@
+"""AI seats: pluggable policies that pick night actions and day votes.
+
+A table's AIs share one public belief table (suspicion per player, fed by
+deaths and votes that everyone saw) stored in state['beliefs']. Each AI
+adds only what it privately knows: its team if it is evil, its findings
+if it inspects. Decisions rank the table once, then each AI looks at no
+more than DECISION_BUDGET candidates, so a decision costs O(players) per
+table rather than O(players^2).
+"""
+import random
+from typing import Dict, List, Optional
+from game import (Player, Role, EVIL_ROLES, get_player, players_with_role,
+                  get_vote_ledger, process_night_actions, process_votes)
+
+DEFAULT_POLICY = 'belief'
+
+# Candidates one AI weighs per decision
+DECISION_BUDGET = 4
+# Random spread added to scores so identical AIs don't all vote in lockstep
+NOISE = 0.5
+# Suspicion added to everyone who voted against a player later killed at night
+VOTED_AGAINST_VICTIM = 1.0
+# Score for a player an AI knows to be evil or good
+KNOWN = 10.0
+
+
+def get_beliefs(game_state: Dict) -> Dict:
+    return game_state.setdefault('beliefs', {'suspicion': {}, 'day_votes': {}})
+
+def ai_holders(game_state: Dict, role: Role) -> List[Player]:
+    """Alive holders of role, if every alive holder is an AI"""
+    holders = [p for p in players_with_role(game_state, role) if p.alive]
+    return holders if holders and all(p.is_ai for p in holders) else []
+
+
+class RandomPolicy:
+    """The original behaviour: a random kill and random votes, nothing else"""
+
+    def choose_night_actions(self, game_state: Dict, rng) -> None:
+        actions = game_state['night_actions']
+        if ai_holders(game_state, Role.NIGHTMARE) and not actions.get('kill_target'):
+            targets = [p for p in game_state['players'] if p.alive and p.role not in EVIL_ROLES]
+            if targets:
+                actions['kill_target'] = rng.choice(targets).sid
+
+    def choose_votes(self, game_state: Dict, rng) -> None:
+        ledger = get_vote_ledger(game_state)
+        alive = [p for p in game_state['players'] if p.alive]
+        # Pick any other alive player without building a list per voter
+        for i, player in enumerate(alive):
+            if player.is_ai and player.sid not in ledger.votes and len(alive) > 1:
+                j = rng.randrange(len(alive) - 1)
+                ledger.cast(player.sid, alive[j + 1 if j >= i else j].sid)
+
+    def observe_night(self, game_state: Dict) -> None:
+        pass
+
+    def observe_day(self, game_state: Dict) -> None:
+        pass
+
+
+class BeliefPolicy(RandomPolicy):
+    def choose_night_actions(self, game_state: Dict, rng) -> None:
+        actions = game_state['night_actions']
+        suspicion = get_beliefs(game_state)['suspicion']
+        inspections = game_state.get('inspections') or {}
+        alive = [p for p in game_state['players'] if p.alive]
+        good = [p for p in alive if p.role not in EVIL_ROLES]
+
+        # The evil team picks one kill: a known Detective first, then whoever
+        # has been voting against the team, then whoever the table trusts most
+        if ai_holders(game_state, Role.NIGHTMARE) and not actions.get('kill_target') and good:
+            witch_findings = inspections.get('witch', {})
+            team = {p.sid for p in alive if p.role in EVIL_ROLES}
+            accusers: Dict[str, int] = {}
+            for voter, target in get_beliefs(game_state)['day_votes'].items():
+                if target in team:
+                    accusers[voter] = accusers.get(voter, 0) + 1
+            actions['kill_target'] = max(good, key=lambda p: (
+                KNOWN * (witch_findings.get(p.sid) == Role.DETECTIVE.value)
+                + 2 * accusers.get(p.sid, 0) - suspicion.get(p.sid, 0.0) + rng.random() * NOISE)).sid
+
+        # Witch looks for the Detective among the trusted players nobody has inspected
+        if ai_holders(game_state, Role.WITCH) and not actions.get('witch_inspection'):
+            seen = inspections.get('witch', {})
+            fresh = [p for p in good if p.sid not in seen]
+            if fresh:
+                actions['witch_inspection'] = min(
+                    fresh, key=lambda p: suspicion.get(p.sid, 0.0) + rng.random() * NOISE).sid
+
+        # Detective checks the most suspected player it has not checked yet
+        detectives = ai_holders(game_state, Role.DETECTIVE)
+        if detectives and not actions.get('detective_inspection'):
+            seen = inspections.get('detective', {})
+            own = {p.sid for p in detectives}
+            fresh = [p for p in alive if p.sid not in seen and p.sid not in own]
+            if fresh:
+                actions['detective_inspection'] = max(
+                    fresh, key=lambda p: suspicion.get(p.sid, 0.0) + rng.random() * NOISE).sid
+
+        # A Duant dies with its link, so it links the player least likely to be killed
+        duants = ai_holders(game_state, Role.DUANT)
+        if duants and not actions.get('duant_target'):
+            others = [p for p in alive if p not in duants]
+            if others:
+                actions['duant_target'] = max(
+                    others, key=lambda p: suspicion.get(p.sid, 0.0) + rng.random() * NOISE).sid
+
+    def choose_votes(self, game_state: Dict, rng) -> None:
+        ledger = get_vote_ledger(game_state)
+        voters = [p for p in game_state['players'] if p.alive and p.is_ai and p.sid not in ledger.votes]
+        if not voters:
+            return
+        suspicion = get_beliefs(game_state)['suspicion']
+        inspections = game_state.get('inspections') or {}
+        alive = [p for p in game_state['players'] if p.alive]
+        if len(alive) < 2:
+            return
+
+        # One ranking for the whole table; each AI only looks at its head
+        ranking = sorted(alive, key=lambda p: suspicion.get(p.sid, 0.0), reverse=True)
+        team = {p.sid for p in alive if p.role in EVIL_ROLES}
+        good_ranking = [p for p in ranking if p.sid not in team]
+
+        # What each side privately knows, as score overrides per player
+        detective_findings = inspections.get('detective', {})
+        good_known = {sid: KNOWN if result == 'evil' else -KNOWN for sid, result in detective_findings.items()
+                      if get_player(game_state, sid) and get_player(game_state, sid).alive}
+        evil_known = {sid: KNOWN for sid, role in inspections.get('witch', {}).items()
+                      if role == Role.DETECTIVE.value and sid not in team}
+
+        for voter in voters:
+            if voter.role in EVIL_ROLES:
+                # Pile onto whichever good player the table already suspects
+                candidates, known = good_ranking, evil_known
+            else:
+                candidates, known = ranking, good_known if voter.role == Role.DETECTIVE else {}
+            options = [p for p in candidates[:DECISION_BUDGET + 1] if p is not voter][:DECISION_BUDGET]
+            options += [get_player(game_state, sid) for sid in known if sid != voter.sid]
+            options = [p for p in options if p and p.alive]
+            if not options:
+                continue
+            target = max(options, key=lambda p: suspicion.get(p.sid, 0.0) + known.get(p.sid, 0.0)
+                         + rng.random() * NOISE)
+            ledger.cast(voter.sid, target.sid)
+
+    def observe_night(self, game_state: Dict) -> None:
+        # The Nightmare kills good players, so their accusers look worse
+        beliefs = get_beliefs(game_state)
+        suspicion = beliefs['suspicion']
+        for dead in game_state['deaths']:
+            for voter, target in beliefs['day_votes'].items():
+                if target == dead:
+                    suspicion[voter] = suspicion.get(voter, 0.0) + VOTED_AGAINST_VICTIM
+
+    def observe_day(self, game_state: Dict) -> None:
+        get_beliefs(game_state)['day_votes'] = dict(get_vote_ledger(game_state).votes)
+
+
+POLICIES = {
+    'random': RandomPolicy(),
+    'belief': BeliefPolicy()
+}
+
+def get_policy(game_state: Dict):
+    return POLICIES[game_state.get('ai_policy') or DEFAULT_POLICY]
+
+def run_night(game_state: Dict, rng: Optional[random.Random] = None) -> Dict:
+    """Let the AIs act, resolve the night, and update what they believe"""
+    policy = get_policy(game_state)
+    policy.choose_night_actions(game_state, rng or random)
+    process_night_actions(game_state)
+    policy.observe_night(game_state)
+    return game_state
+
+def run_day(game_state: Dict, rng: Optional[random.Random] = None) -> Dict:
+    """Let the AIs vote, resolve the day, and update what they believe"""
+    policy = get_policy(game_state)
+    policy.choose_votes(game_state, rng or random)
+    process_votes(game_state)
+    policy.observe_day(game_state)
+    return game_state
@@ -0,0 +1,147 @@
+"""Role-deck balance: win rates from large batches of seeded all-AI games.
+
+    python balance.py --games 1000000 --rules classic
+    python balance.py --games 200000 --rules event --table-size 30 --policy random --json
+
+Games are split into chunks played across a process pool. Game i always
+uses seed + i, so the results do not depend on the worker count. Each
+chunk comes back as counters only and at most two chunks per worker are
+in flight, so memory stays flat however many games are played.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Optional
+from game import Role, RULE_SETS, DEFAULT_RULES, faction
+from ai import DEFAULT_POLICY, POLICIES
+from simulate import simulate_game
+
+FACTIONS = ('good', 'evil', 'joker')
+CHUNK_SIZE = 1000
+# Two-sided 95% normal quantile
+Z_95 = 1.959964
+
+def wilson_interval(wins: int, games: int, z: float = Z_95):
+    """Wilson score interval for a win rate; sound near 0 and 1 and for small samples"""
+    if not games:
+        return 0.0, 0.0
+    p = wins / games
+    denominator = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denominator
+    spread = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+def new_totals() -> Dict:
+    return {'games': 0, 'rounds': 0, 'unfinished': 0, 'winners': Counter(),
+            'role_games': Counter(), 'role_wins': Counter()}
+
+def play_chunk(first_seed: int, count: int, rules: str, table_size: Optional[int], policy: str) -> Dict:
+    """Play count games in a worker and return only their counters"""
+    totals = new_totals()
+    for seed in range(first_seed, first_seed + count):
+        result = simulate_game(seed, rules, table_size, policy=policy)
+        totals['games'] += 1
+        totals['rounds'] += result['rounds']
+        winner = result['winner']
+        if winner is None:
+            totals['unfinished'] += 1
+            continue
+        totals['winners'][winner] += 1
+        for role, _ in result['players']:
+            totals['role_games'][role] += 1
+            if faction(Role(role)) == winner:
+                totals['role_wins'][role] += 1
+    return totals
+
+def merge(totals: Dict, chunk: Dict) -> None:
+    for key in ('games', 'rounds', 'unfinished'):
+        totals[key] += chunk[key]
+    for key in ('winners', 'role_games', 'role_wins'):
+        totals[key].update(chunk[key])
+
+def run_balance(games: int, seed: int = 0, rules: str = DEFAULT_RULES, table_size: Optional[int] = None,
+                policy: str = DEFAULT_POLICY, workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                progress: bool = False) -> Dict:
+    totals = new_totals()
+    started = time.perf_counter()
+    chunks = ((first, min(chunk_size, seed + games - first)) for first in range(seed, seed + games, chunk_size))
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for first, count in chunks:
+            pending.add(pool.submit(play_chunk, first, count, rules, table_size, policy))
+            if len(pending) < 2 * workers:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                merge(totals, future.result())
+            if progress:
+                rate = totals['games'] / (time.perf_counter() - started)
+                print(f"\r{totals['games']}/{games} games, {rate:.0f}/s", end='', file=sys.stderr)
+        for future in pending:
+            merge(totals, future.result())
+    if progress:
+        print(file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    finished = totals['games'] - totals['unfinished']
+
+    def rate(wins: int, played: int) -> Dict:
+        low, high = wilson_interval(wins, played)
+        return {'wins': wins, 'games': played, 'win_rate': wins / played if played else 0.0,
+                'ci95': [low, high]}
+
+    return {
+        'rules': rules,
+        'table_size': table_size,
+        'policy': policy,
+        'games': totals['games'],
+        'seed': seed,
+        'workers': workers,
+        'elapsed_s': elapsed,
+        'games_per_sec': totals['games'] / elapsed if elapsed else 0.0,
+        'mean_rounds': totals['rounds'] / totals['games'] if totals['games'] else 0.0,
+        'unfinished': totals['unfinished'],
+        'factions': {name: rate(totals['winners'][name], finished) for name in FACTIONS},
+        'roles': {role: rate(totals['role_wins'][role], played)
+                  for role, played in sorted(totals['role_games'].items())}
+    }
+
+def print_report(report: Dict) -> None:
+    size = report['table_size'] or RULE_SETS[report['rules']].min_players
+    print(f"{report['games']} games ({report['rules']}, {size} players, {report['policy']} AI) "
+          f"on {report['workers']} workers in {report['elapsed_s']:.1f}s, {report['games_per_sec']:.0f} games/sec")
+    print(f"  {report['mean_rounds']:.1f} rounds/game, {report['unfinished']} hit the round limit")
+    for title, rows in (('faction', report['factions']), ('role', report['roles'])):
+        print(f"  {title:<10} {'win rate':>9} {'95% CI':>17} {'games':>10}")
+        for name, stats in rows.items():
+            low, high = stats['ci95']
+            print(f"  {name:<10} {stats['win_rate']:>9.2%} {f'{low:.2%}-{high:.2%}':>17} {stats['games']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate role and faction win rates from all-AI games")
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rules', choices=sorted(RULE_SETS), default=DEFAULT_RULES)
+    parser.add_argument('--table-size', type=int, default=None)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default=DEFAULT_POLICY)
+    parser.add_argument('--workers', type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="games per task sent to a worker")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_balance(args.games, args.seed, args.rules, args.table_size, args.policy,
+                         args.workers, args.chunk_size, progress=not args.json)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Game engine throughput benchmark.
+
+    python bench.py --games 5000 --rules classic
+    python bench.py --games 500 --rules event --table-size 50 --json > bench.json
+
+Reports games/sec, per-phase latency percentiles and memory per game so
+runs can be compared between commits.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Dict, List
+from game import RULE_SETS, DEFAULT_RULES
+from simulate import PHASES, simulate_game
+
+def percentile(sorted_values: List[int], pct: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_benchmark(games: int, seed: int = 0, rules: str = DEFAULT_RULES, table_size: int = None) -> Dict:
+    # Warm up caches and the allocator before timing anything
+    for i in range(min(games, 50)):
+        simulate_game(seed - i - 1, rules, table_size)
+
+    timings: Dict[str, List[int]] = {phase: [] for phase in PHASES}
+    rounds = 0
+    started = time.perf_counter()
+    for i in range(games):
+        rounds += simulate_game(seed + i, rules, table_size, timings)['rounds']
+    elapsed = time.perf_counter() - started
+
+    # Allocation pass runs separately since tracing slows everything down
+    sampled = max(1, games // 10)
+    peaks = []
+    tracemalloc.start()
+    for i in range(sampled):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        simulate_game(seed + i, rules, table_size)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    phases = {}
+    for phase, values in timings.items():
+        values.sort()
+        phases[phase] = {
+            'calls': len(values),
+            'p50_us': percentile(values, 50) / 1000,
+            'p95_us': percentile(values, 95) / 1000,
+            'p99_us': percentile(values, 99) / 1000,
+            'max_us': (values[-1] if values else 0) / 1000
+        }
+
+    return {
+        'rules': rules,
+        'table_size': table_size,
+        'games': games,
+        'seed': seed,
+        'elapsed_s': elapsed,
+        'games_per_sec': games / elapsed if elapsed else 0.0,
+        'mean_rounds': rounds / games if games else 0.0,
+        'phases': phases,
+        'peak_kib_per_game': sum(peaks) / len(peaks) / 1024
+    }
+
+def print_report(report: Dict) -> None:
+    size = report['table_size'] or RULE_SETS[report['rules']].min_players
+    print(f"{report['games']} games ({report['rules']}, {size} players) in {report['elapsed_s']:.2f}s")
+    print(f"  {report['games_per_sec']:.0f} games/sec, {report['mean_rounds']:.1f} rounds/game, "
+          f"{report['peak_kib_per_game']:.1f} KiB peak/game")
+    print(f"  {'phase':<10} {'calls':>8} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'max us':>9}")
+    for phase, stats in report['phases'].items():
+        print(f"  {phase:<10} {stats['calls']:>8} {stats['p50_us']:>9.1f} {stats['p95_us']:>9.1f} "
+              f"{stats['p99_us']:>9.1f} {stats['max_us']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game engine with headless all-AI games")
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rules', choices=sorted(RULE_SETS), default=DEFAULT_RULES)
+    parser.add_argument('--table-size', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.games, args.seed, args.rules, args.table_size)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Room ownership across server processes.
+
+Every room is owned by exactly one node, which runs its game logic and
+phase timers. Socket events from a player connected to another node are
+forwarded to the owner, and the owner's emits reach that player through
+the Socket.IO message queue.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set
+import redis.asyncio as aioredis
+
+# dispatch(event, sid, data, origin_node)
+Dispatch = Callable[[str, str, object, str], Awaitable[None]]
+
+# Ownership leases are renewed every third of their lifetime
+LEASE_SECONDS = 15
+
+RENEW_IF_OWNER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_IF_OWNER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def new_node_id() -> str:
+    return os.environ.get('MAFIA_NODE_ID') or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class LocalBus:
+    """In-process stand-in for Redis: owners and node inboxes in plain dicts"""
+
+    def __init__(self):
+        self.owners: Dict[str, str] = {}
+        self.nodes: Dict[str, Dispatch] = {}
+
+
+class LocalCluster:
+    """Nodes sharing a LocalBus, for a single process or for tests"""
+
+    def __init__(self, node_id: Optional[str] = None, bus: Optional[LocalBus] = None):
+        self.node_id = node_id or new_node_id()
+        self.bus = bus or LocalBus()
+        self.dispatch: Optional[Dispatch] = None
+
+    def on_message(self, dispatch: Dispatch) -> None:
+        self.dispatch = dispatch
+        self.bus.nodes[self.node_id] = dispatch
+
+    async def claim(self, room_id: str) -> str:
+        """Take ownership of a room if nobody holds it; returns the owner"""
+        return self.bus.owners.setdefault(room_id, self.node_id)
+
+    async def unowned(self, room_ids: Iterable[str]) -> List[str]:
+        """The rooms nobody holds"""
+        return [room_id for room_id in room_ids if room_id not in self.bus.owners]
+
+    async def release(self, room_id: str) -> None:
+        if self.bus.owners.get(room_id) == self.node_id:
+            del self.bus.owners[room_id]
+
+    async def forward(self, node_id: str, event: str, sid: str, data=None) -> None:
+        dispatch = self.bus.nodes.get(node_id)
+        if dispatch is None:
+            logging.warning(f"Dropping {event} for {sid}: node {node_id} is gone")
+            return
+        await dispatch(event, sid, data, self.node_id)
+
+    async def stop(self) -> None:
+        self.bus.nodes.pop(self.node_id, None)
+
+
+class RedisCluster:
+    """Ownership leases and a per-node inbox channel on Redis.
+
+    A room's owner holds mafia:{room_id}:owner with a TTL and keeps it
+    alive from its own timer; if the node dies the lease lapses and the
+    room can be claimed again. Forwarded events run in a task per socket,
+    in the order they arrived, so a slow handler only holds up its own
+    socket's later events.
+    """
+
+    def __init__(self, client: aioredis.Redis, node_id: Optional[str] = None):
+        self.client = client
+        self.node_id = node_id or new_node_id()
+        self.dispatch: Optional[Dispatch] = None
+        self._owned: Set[str] = set()
+        self._renew = client.register_script(RENEW_IF_OWNER)
+        self._release = client.register_script(RELEASE_IF_OWNER)
+        self._task: Optional[asyncio.Task] = None
+        self._renewer: Optional[asyncio.Task] = None
+        self._listening = asyncio.Event()
+        # Forwarded messages waiting per sid; a sid has a running task while it has an entry
+        self._pending: Dict[str, Deque[Dict]] = {}
+        self._workers: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def owner_key(room_id: str) -> str:
+        return f"mafia:{{{room_id}}}:owner"
+
+    @staticmethod
+    def inbox(node_id: str) -> str:
+        return f"mafia:node:{node_id}"
+
+    def on_message(self, dispatch: Dispatch) -> None:
+        self.dispatch = dispatch
+
+    async def claim(self, room_id: str) -> str:
+        """Take ownership of a room if nobody holds it; returns the owner"""
+        await self._ensure_running()
+        if room_id in self._owned:
+            # Our lease, kept alive by the renewal loop, which drops any it fails to renew
+            return self.node_id
+        key = self.owner_key(room_id)
+        if await self.client.set(key, self.node_id, nx=True, px=LEASE_SECONDS * 1000):
+            self._owned.add(room_id)
+            return self.node_id
+        owner = await self.client.get(key)
+        if owner is None:
+            # Lease lapsed between SET and GET; try once more
+            return await self.claim(room_id)
+        if owner == self.node_id:
+            self._owned.add(room_id)
+        return owner
+
+    async def unowned(self, room_ids: Iterable[str]) -> List[str]:
+        """The rooms nobody holds, found with one round trip for all of them"""
+        room_ids = list(room_ids)
+        if not room_ids:
+            return []
+        # GETs rather than one MGET: each lease key hashes to its own room's cluster slot
+        async with self.client.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                pipe.get(self.owner_key(room_id))
+            owners = await pipe.execute()
+        return [room_id for room_id, owner in zip(room_ids, owners) if owner is None]
+
+    async def release(self, room_id: str) -> None:
+        self._owned.discard(room_id)
+        await self._release(keys=[self.owner_key(room_id)], args=[self.node_id])
+
+    async def forward(self, node_id: str, event: str, sid: str, data=None) -> None:
+        await self._ensure_running()
+        message = json.dumps({'event': event, 'sid': sid, 'data': data, 'origin': self.node_id})
+        if not await self.client.publish(self.inbox(node_id), message):
+            logging.warning(f"Dropping {event} for {sid}: node {node_id} is not listening")
+
+    async def _ensure_running(self) -> None:
+        """Start the inbox and renewal loops; replies to a forward must not beat the subscription"""
+        loop = asyncio.get_running_loop()
+        if self._renewer is None or self._renewer.done():
+            self._renewer = loop.create_task(self._renew_forever())
+        if self._task is None or self._task.done():
+            self._listening.clear()
+            self._task = loop.create_task(self._run())
+        await self._listening.wait()
+
+    async def _run(self) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.inbox(self.node_id))
+        self._listening.set()
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None and self.dispatch is not None:
+                    self._deliver(json.loads(message['data']))
+        finally:
+            await pubsub.aclose()
+
+    def _deliver(self, body: Dict) -> None:
+        """Queue a forwarded message behind any still running for the same sid"""
+        pending = self._pending.get(body['sid'])
+        if pending is not None:
+            pending.append(body)
+            return
+        self._pending[body['sid']] = deque([body])
+        worker = asyncio.get_running_loop().create_task(self._drain(body['sid']))
+        self._workers.add(worker)
+        worker.add_done_callback(self._workers.discard)
+
+    async def _drain(self, sid: str) -> None:
+        pending = self._pending[sid]
+        try:
+            while pending:
+                body = pending.popleft()
+                try:
+                    await self.dispatch(body['event'], sid, body['data'], body['origin'])
+                except Exception:
+                    logging.exception(f"Forwarded {body['event']} from {body['origin']} failed")
+        finally:
+            if self._pending.get(sid) is pending:
+                del self._pending[sid]
+
+    async def _renew_forever(self) -> None:
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            try:
+                await self._renew_leases()
+            except Exception:
+                # Keep trying; a lease only lapses after three missed renewals
+                logging.exception("Renewing room leases failed")
+
+    async def _renew_leases(self) -> None:
+        owned = list(self._owned)
+        if not owned:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for room_id in owned:
+                await self._renew(keys=[self.owner_key(room_id)], args=[self.node_id, LEASE_SECONDS * 1000],
+                                  client=pipe)
+            results = await pipe.execute()
+        for room_id, renewed in zip(owned, results):
+            if not renewed:
+                logging.warning(f"Lost ownership of room {room_id}")
+                self._owned.discard(room_id)
+
+    async def stop(self) -> None:
+        for task in [self._task, self._renewer, *self._workers]:
+            if task is not None:
+                task.cancel()
+        self._task = self._renewer = None
+        self._pending.clear()
+        for room_id in list(self._owned):
+            await self.release(room_id)
+
+
+def create_cluster(client: Optional[aioredis.Redis]):
+    """Redis-backed ownership when Redis is up, else a single local node"""
+    if client is not None:
+        return RedisCluster(client)
+    return LocalCluster()
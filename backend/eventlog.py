@@ -0,0 +1,175 @@
+"""Append-only log of game state changes, for rebuilding games after a restart.
+
+Each record is one JSON line. A change is stored as the same field-level
+Redis ops the state layer computes anyway (see state.diff_snapshots), so
+both backends log one format. Every room is snapshotted every
+SNAPSHOT_EVERY changes, which bounds the replay work per room, and the file
+is compacted to one snapshot per live room when it is opened and again
+after every COMPACT_EVERY records.
+
+Callers only queue records. One writer thread encodes and writes them in
+batches, flushing once per batch, so file I/O and compaction stay off the
+event loop.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Dict, List, Tuple
+
+SNAPSHOT_EVERY = 50
+COMPACT_EVERY = 10000
+
+def _section(key: str) -> str:
+    # mafia:{room_id}:meta -> meta, mafia:{room_id}:player:<sid> -> player:<sid>
+    return key.split('}:', 1)[1]
+
+def apply_ops(snapshot: Dict, ops: List[List[str]]) -> Dict:
+    """Replay diff ops onto a stored snapshot in place; the inverse of diff_snapshots"""
+    for command, key, *args in ops:
+        section = _section(key)
+        if section == 'players':
+            order = snapshot['order']
+            if command == 'RPUSH':
+                order.extend(args)
+            elif command == 'LREM':
+                order.remove(args[1])
+            elif command == 'DEL':
+                order.clear()
+        elif section == 'alive':
+            if command == 'SADD':
+                snapshot['alive'].update(args)
+            elif command == 'SREM':
+                snapshot['alive'].difference_update(args)
+            elif command == 'DEL':
+                snapshot['alive'].clear()
+        else:
+            if section.startswith('player:'):
+                fields = snapshot['players'].setdefault(section[len('player:'):], {})
+            else:
+                fields = snapshot[section]
+            if command == 'HSET':
+                fields.update(zip(args[::2], args[1::2]))
+            elif command == 'HDEL':
+                for field in args:
+                    fields.pop(field, None)
+            elif command == 'DEL':
+                if section.startswith('player:'):
+                    del snapshot['players'][section[len('player:'):]]
+                else:
+                    fields.clear()
+    return snapshot
+
+def encode_snapshot(snapshot: Dict) -> Dict:
+    return {**snapshot, 'alive': sorted(snapshot['alive'])}
+
+def decode_snapshot(data: Dict) -> Dict:
+    return {**data, 'alive': set(data['alive'])}
+
+
+class EventLog:
+    def __init__(self, path: str, snapshot_every: int = SNAPSHOT_EVERY, compact_every: int = COMPACT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.compact_every = compact_every
+        self._rooms = self._compact()
+        # Changes logged per room since its last snapshot; compaction snapshots every live room
+        self._since_snapshot: Dict[str, int] = {room_id: 0 for room_id in self._rooms}
+        self._file = open(path, 'a', encoding='utf-8')
+        # Records written since the file was last compacted; only touched by the writer thread
+        self._written = 0
+        # Records waiting for the writer, then None once the log is closed
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._writer.start()
+
+    def append(self, room_id: str, version: int, ops: List[List[str]], snapshot: Dict) -> None:
+        """Log one change; every snapshot_every-th change per room is logged as a full snapshot"""
+        count = self._since_snapshot.get(room_id)
+        if count is None or count >= self.snapshot_every:
+            record = {'room': room_id, 'v': version, 'snapshot': encode_snapshot(snapshot)}
+            self._since_snapshot[room_id] = 0
+        else:
+            record = {'room': room_id, 'v': version, 'ops': ops}
+            self._since_snapshot[room_id] = count + 1
+        self._write(record)
+
+    def drop(self, room_id: str) -> None:
+        """Forget a room; replay skips everything logged for it so far"""
+        if self._since_snapshot.pop(room_id, None) is not None:
+            self._write({'room': room_id, 'drop': True})
+
+    def _write(self, record: Dict) -> None:
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Block until every record queued so far is in the file"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                for record in batch:
+                    if record is not None:
+                        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+                # Reaches the OS once per batch, so a crashed process loses at most what was still queued
+                self._file.flush()
+                self._written += len(batch)
+                if self._written >= self.compact_every:
+                    self._file.close()
+                    self._compact()
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    self._written = 0
+            except Exception:
+                logging.exception(f"Writing the event log {self.path} failed")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def rooms(self) -> Dict[str, Tuple[int, Dict]]:
+        """Rooms that were live when the log was opened: room_id -> (version, snapshot)"""
+        return self._rooms
+
+    def _replay(self) -> Dict[str, Tuple[int, Dict]]:
+        rooms: Dict[str, Tuple[int, Dict]] = {}
+        if not os.path.exists(self.path):
+            return rooms
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    logging.warning(f"Skipping unreadable event log line in {self.path}")
+                    continue
+                room_id = record['room']
+                if record.get('drop'):
+                    rooms.pop(room_id, None)
+                elif 'snapshot' in record:
+                    rooms[room_id] = (record['v'], decode_snapshot(record['snapshot']))
+                elif room_id in rooms:
+                    rooms[room_id] = (record['v'], apply_ops(rooms[room_id][1], record['ops']))
+        return rooms
+
+    def _compact(self) -> Dict[str, Tuple[int, Dict]]:
+        """Rewrite the log as one snapshot per live room"""
+        rooms = self._replay()
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            for room_id, (version, snapshot) in rooms.items():
+                f.write(json.dumps({'room': room_id, 'v': version, 'snapshot': encode_snapshot(snapshot)},
+                                   separators=(',', ':')) + '\n')
+        os.replace(temp, self.path)
+        return rooms
+
+    def close(self) -> None:
+        """Write out everything queued, then stop the writer"""
+        self._queue.put(None)
+        self._writer.join()
+        self._file.close()
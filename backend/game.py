@@ -23,7 +23,65 @@ class GamePhase(Enum):
     DAY = "day"
     GAME_OVER = "game_over"
 
+EVIL_ROLES = {Role.NIGHTMARE, Role.WITCH}
+
+def faction(role: Role) -> str:
+    """Which winner value counts as a win for this role"""
+    if role in EVIL_ROLES:
+        return 'evil'
+    return 'joker' if role == Role.JOKER else 'good'
+
+class RuleSet:
+    """Roster size and role deck for a table.
+
+    Special roles are dealt at fixed counts, plus one extra Nightmare per
+    players_per_nightmare seats on big tables; Villagers fill the rest.
+    """
+
+    def __init__(self, name: str, min_players: int, max_players: int,
+                 roles: Dict[Role, int], players_per_nightmare: Optional[int] = None):
+        self.name = name
+        self.min_players = min_players
+        self.max_players = max_players
+        self.roles = roles
+        self.players_per_nightmare = players_per_nightmare
+
+    def role_deck(self, player_count: int) -> List[Role]:
+        """Build the (unshuffled) list of roles for player_count seats"""
+        if not self.min_players <= player_count <= self.max_players:
+            raise ValueError(f"Rule set '{self.name}' requires {self.min_players}-{self.max_players} players")
+
+        counts = dict(self.roles)
+        if self.players_per_nightmare:
+            counts[Role.NIGHTMARE] = max(counts.get(Role.NIGHTMARE, 0), player_count // self.players_per_nightmare)
+
+        deck = [role for role, count in counts.items() for _ in range(count)]
+        if len(deck) > player_count:
+            raise ValueError(f"Rule set '{self.name}' deals {len(deck)} special roles to {player_count} players")
+        deck.extend([Role.VILLAGER] * (player_count - len(deck)))
+        return deck
+
+RULE_SETS = {
+    'classic': RuleSet('classic', 7, 7, {
+        Role.NIGHTMARE: 1, Role.WITCH: 1, Role.DETECTIVE: 1,
+        Role.DUANT: 1, Role.JOKER: 1, Role.KING: 1
+    }),
+    'small': RuleSet('small', 5, 6, {
+        Role.NIGHTMARE: 1, Role.DETECTIVE: 1, Role.KING: 1
+    }),
+    'event': RuleSet('event', 8, 50, {
+        Role.WITCH: 1, Role.DETECTIVE: 1, Role.DUANT: 1, Role.JOKER: 1, Role.KING: 1
+    }, players_per_nightmare=5)
+}
+
+DEFAULT_RULES = 'classic'
+
+def get_rule_set(game_state: Dict) -> RuleSet:
+    return RULE_SETS[game_state.get('rules', DEFAULT_RULES)]
+
 class Player:
+    __slots__ = ('sid', 'name', 'role', 'alive', 'votes', 'is_ai')
+
     def __init__(self, sid: str, name: str, is_ai: bool = False):
         self.sid = sid
         self.name = name
@@ -42,40 +100,91 @@ class Player:
             "is_ai": self.is_ai
         }
 
-def assign_roles(players: List[Player]) -> None:
-    """Assign roles to players randomly"""
-    if len(players) != 7:
-        raise ValueError("Game requires exactly 7 players")
+    def to_public_dict(self):
+        """What everyone at the table may see; roles stay private"""
+        return {
+            "sid": self.sid,
+            "name": self.name,
+            "alive": self.alive,
+            "is_ai": self.is_ai
+        }
 
-    roles = [
-        Role.NIGHTMARE,
-        Role.WITCH,
-        Role.DETECTIVE,
-        Role.DUANT,
-        Role.JOKER,
-        Role.KING,
-        Role.VILLAGER
-    ]
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Player':
+        player = cls(data['sid'], data['name'], is_ai=data.get('is_ai', False))
+        player.role = Role(data['role']) if data.get('role') else None
+        player.alive = data.get('alive', True)
+        player.votes = data.get('votes', 0)
+        return player
+
+# Lookups rebuilt from state['players']; never persisted
+DERIVED_KEYS = ('player_index', 'role_index', 'vote_ledger')
+
+def index_players(game_state: Dict) -> Dict:
+    """Rebuild the sid -> Player and Role -> [Player] lookups"""
+    player_index = {}
+    role_index: Dict[Role, List[Player]] = {}
+    for player in game_state['players']:
+        player_index[player.sid] = player
+        if player.role:
+            role_index.setdefault(player.role, []).append(player)
+    game_state['player_index'] = player_index
+    game_state['role_index'] = role_index
+    return game_state
+
+def get_player(game_state: Dict, sid: Optional[str]) -> Optional[Player]:
+    return game_state['player_index'].get(sid)
+
+def players_with_role(game_state: Dict, role: Role) -> List[Player]:
+    return game_state['role_index'].get(role, [])
+
+def add_player(game_state: Dict, player: Player) -> None:
+    game_state['players'].append(player)
+    game_state['player_index'][player.sid] = player
+    if player.role:
+        game_state['role_index'].setdefault(player.role, []).append(player)
+
+def remove_player(game_state: Dict, sid: str) -> Optional[Player]:
+    player = game_state['player_index'].pop(sid, None)
+    if player is None:
+        return None
+    game_state['players'].remove(player)
+    if player.role:
+        game_state['role_index'][player.role].remove(player)
+    return player
+
+def assign_roles(players: List[Player], rules: Optional[RuleSet] = None,
+                 rng: Optional[random.Random] = None) -> None:
+    """Assign roles to players randomly"""
+    roles = (rules or RULE_SETS[DEFAULT_RULES]).role_deck(len(players))
 
-    random.shuffle(roles)
+    (rng or random).shuffle(roles)
 
     for player, role in zip(players, roles):
         player.role = role
 
-def start_game_with_ai(game_state: Dict) -> None:
+def ai_names(count: int, rng: Optional[random.Random] = None) -> List[str]:
+    """Pick count distinct AI names, numbering them once the list runs out"""
+    names = (rng or random).sample(AI_NAMES, min(count, len(AI_NAMES)))
+    for i in range(count - len(names)):
+        names.append(f"{AI_NAMES[i % len(AI_NAMES)]} {i // len(AI_NAMES) + 2}")
+    return names
+
+def start_game_with_ai(game_state: Dict, table_size: Optional[int] = None,
+                       rng: Optional[random.Random] = None) -> None:
     """Fill the game with AI players and start."""
+    rules = get_rule_set(game_state)
     num_players = len(game_state['players'])
-    num_ai_to_add = 7 - num_players
-
-    random.shuffle(AI_NAMES)
-    ai_names_to_use = AI_NAMES[:num_ai_to_add]
+    table_size = max(num_players, rules.min_players, min(table_size or 0, rules.max_players))
+    num_ai_to_add = table_size - num_players
 
-    for i, ai_name in enumerate(ai_names_to_use):
+    for i, ai_name in enumerate(ai_names(num_ai_to_add, rng)):
         ai_sid = f"ai_{i}"
         ai_player = Player(ai_sid, ai_name, is_ai=True)
-        game_state['players'].append(ai_player)
+        add_player(game_state, ai_player)
 
-    assign_roles(game_state['players'])
+    assign_roles(game_state['players'], rules, rng)
+    index_players(game_state)
 
 def start_night_phase(game_state: Dict) -> Dict:
     """Initialize night phase actions"""
@@ -89,29 +198,40 @@ def start_night_phase(game_state: Dict) -> Dict:
     game_state['phase'] = GamePhase.NIGHT.value
     return game_state
 
+# Role -> the night_actions slot that role fills
+NIGHT_ACTION_ROLES = {
+    Role.NIGHTMARE: 'kill_target',
+    Role.WITCH: 'witch_inspection',
+    Role.DETECTIVE: 'detective_inspection',
+    Role.DUANT: 'duant_target'
+}
+
+def night_actions_complete(game_state: Dict) -> bool:
+    """True once every alive human with a night role has acted"""
+    actions = game_state.get('night_actions') or {}
+    for role, slot in NIGHT_ACTION_ROLES.items():
+        if actions.get(slot):
+            continue
+        if any(p.alive and not p.is_ai for p in players_with_role(game_state, role)):
+            return False
+    return True
+
 def process_night_actions(game_state: Dict) -> Dict:
-    """Process all night actions and determine deaths"""
+    """Process all night actions and determine deaths (AI seats act beforehand, see ai.py)"""
     actions = game_state['night_actions']
-    players = game_state['players']
     deaths = []
 
-    # AI Nightmare action
-    nightmare = next((p for p in players if p.role == Role.NIGHTMARE and p.is_ai and p.alive), None)
-    if nightmare and not actions.get('kill_target'):
-        possible_targets = [p for p in players if p.alive and p.role not in {Role.NIGHTMARE, Role.WITCH}]
-        if possible_targets:
-            target = random.choice(possible_targets)
-            actions['kill_target'] = target.sid
+    inspections = game_state.setdefault('inspections', {'witch': {}, 'detective': {}})
 
     # Witch inspects and shares with Nightmare
-    if actions['witch_inspection']:
-        # Logic for witch action
-        pass
+    witch_target = get_player(game_state, actions.get('witch_inspection'))
+    if witch_target:
+        inspections['witch'][witch_target.sid] = witch_target.role.value
 
-    # Detective inspects
-    if actions['detective_inspection']:
-        # Logic for detective action
-        pass
+    # Detective inspects; the Nightmare hides as good
+    detective_target = get_player(game_state, actions.get('detective_inspection'))
+    if detective_target:
+        inspections['detective'][detective_target.sid] = 'evil' if detective_target.role == Role.WITCH else 'good'
 
     # Duant links
     if actions['duant_target']:
@@ -120,7 +240,7 @@ def process_night_actions(game_state: Dict) -> Dict:
 
     # Process kill
     if actions['kill_target']:
-        target_player = next((p for p in game_state['players'] if p.sid == actions['kill_target']), None)
+        target_player = get_player(game_state, actions['kill_target'])
         if target_player:
             if target_player.role == Role.KING:
                 # King has 2 lives
@@ -133,7 +253,7 @@ def process_night_actions(game_state: Dict) -> Dict:
                 deaths.append(target_player.sid)
 
             # Check Duant link
-            duant = next((p for p in game_state['players'] if p.role == Role.DUANT and p.alive), None)
+            duant = next((p for p in players_with_role(game_state, Role.DUANT) if p.alive), None)
             if duant and actions.get('duant_target') == target_player.sid:
                 duant.alive = False
                 deaths.append(duant.sid)
@@ -141,35 +261,104 @@ def process_night_actions(game_state: Dict) -> Dict:
     game_state['deaths'] = deaths
     return game_state
 
-def process_votes(game_state: Dict, votes: Dict[str, str]) -> Dict:
-    """Process day phase voting"""
-    players = game_state['players']
-    alive_players = [p for p in players if p.alive]
+class VoteLedger:
+    """Day-phase votes with running tallies.
+
+    The leader is kept up to date as votes arrive, so resolving the day
+    needs no recount. Changing a vote away from the leader (or from a tied
+    leader) is the only case that rescans the tallies.
+    """
+
+    __slots__ = ('votes', 'counts', 'leader', 'leader_count', 'tied')
+
+    def __init__(self, votes: Optional[Dict[str, str]] = None):
+        self.votes: Dict[str, str] = {}
+        self.counts: Dict[str, int] = {}
+        self.leader: Optional[str] = None
+        self.leader_count = 0
+        self.tied = False
+        for voter_sid, target_sid in (votes or {}).items():
+            self.cast(voter_sid, target_sid)
+
+    def cast(self, voter_sid: str, target_sid: str) -> None:
+        previous = self.votes.get(voter_sid)
+        if previous == target_sid:
+            return
+        self.votes[voter_sid] = target_sid
+
+        if previous is not None:
+            previous_count = self.counts[previous]
+            if previous_count == 1:
+                del self.counts[previous]
+            else:
+                self.counts[previous] = previous_count - 1
+            if previous_count == self.leader_count:
+                self._recount()
+
+        count = self.counts.get(target_sid, 0) + 1
+        self.counts[target_sid] = count
+        if count > self.leader_count:
+            self.leader, self.leader_count, self.tied = target_sid, count, False
+        elif count == self.leader_count and target_sid != self.leader:
+            self.tied = True
+
+    def _recount(self) -> None:
+        self.leader, self.leader_count, self.tied = None, 0, False
+        for target_sid, count in self.counts.items():
+            if count > self.leader_count:
+                self.leader, self.leader_count, self.tied = target_sid, count, False
+            elif count == self.leader_count:
+                self.tied = True
+
+    def result(self) -> Optional[str]:
+        """The player to eliminate, or None on a tie or no votes"""
+        return None if self.tied else self.leader
+
+def get_vote_ledger(game_state: Dict) -> VoteLedger:
+    """The ledger for the current day, rebuilt from state['votes'] if needed"""
+    ledger = game_state.get('vote_ledger')
+    if ledger is None:
+        ledger = VoteLedger(game_state.get('votes'))
+        game_state['votes'] = ledger.votes
+        game_state['vote_ledger'] = ledger
+    return ledger
+
+def cast_vote(game_state: Dict, voter_sid: str, target_sid: str) -> bool:
+    """Record a day vote; returns False if the vote is not allowed"""
+    if game_state['phase'] != GamePhase.DAY.value:
+        return False
+    voter = get_player(game_state, voter_sid)
+    target = get_player(game_state, target_sid)
+    if not voter or not voter.alive or not target or not target.alive or voter is target:
+        return False
+    get_vote_ledger(game_state).cast(voter_sid, target_sid)
+    return True
+
+def votes_complete(game_state: Dict) -> bool:
+    """True once every alive human has voted (AI votes are filled in at resolution)"""
+    votes = get_vote_ledger(game_state).votes
+    return all(p.sid in votes for p in game_state['players'] if p.alive and not p.is_ai)
+
+def start_day_phase(game_state: Dict) -> Dict:
+    """Open the day with an empty vote ledger"""
+    ledger = VoteLedger()
+    game_state['votes'] = ledger.votes
+    game_state['vote_ledger'] = ledger
+    game_state['eliminated'] = None
+    game_state['phase'] = GamePhase.DAY.value
+    return game_state
 
-    # AI voting
-    for player in alive_players:
-        if player.is_ai and player.sid not in votes:
-            possible_targets = [p for p in alive_players if p.sid != player.sid]
-            if possible_targets:
-                target = random.choice(possible_targets)
-                votes[player.sid] = target.sid
+def process_votes(game_state: Dict, votes: Optional[Dict[str, str]] = None) -> Dict:
+    """Process day phase voting (AI seats vote beforehand, see ai.py)"""
+    ledger = get_vote_ledger(game_state)
+    for voter_sid, target_sid in (votes or {}).items():
+        ledger.cast(voter_sid, target_sid)
 
-    # Reset votes
-    for player in game_state['players']:
-        if player.alive:
-            player.votes = 0
-
-    # Count votes
-    for voter_sid, target_sid in votes.items():
-        target = next((p for p in game_state['players'] if p.sid == target_sid), None)
-        if target and target.alive:
-            target.votes += 1
-
-    # Find player with most votes
-    if alive_players:
-        eliminated = max(alive_players, key=lambda p: p.votes)
+    # Ties (and silent days) eliminate nobody
+    eliminated = get_player(game_state, ledger.result())
+    game_state['eliminated'] = eliminated.sid if eliminated else None
+    if eliminated:
         eliminated.alive = False
-        game_state['eliminated'] = eliminated.sid
 
         # Check Joker win condition
         if eliminated.role == Role.JOKER:
@@ -180,28 +369,40 @@ def process_votes(game_state: Dict, votes: Dict[str, str]) -> Dict:
 
 def check_win_conditions(game_state: Dict) -> Dict:
     """Check if game has ended and who won"""
-    alive_players = [p for p in game_state['players'] if p.alive]
-    evil_roles = {Role.NIGHTMARE, Role.WITCH}
-
-    alive_evil = [p for p in alive_players if p.role in evil_roles]
-    alive_good = [p for p in alive_players if p.role not in evil_roles]
+    alive_evil = alive_good = 0
+    for p in game_state['players']:
+        if p.alive:
+            if p.role in EVIL_ROLES:
+                alive_evil += 1
+            else:
+                alive_good += 1
 
     if not alive_evil:
         game_state['winner'] = 'good'
         game_state['phase'] = GamePhase.GAME_OVER.value
-    elif len(alive_evil) >= len(alive_good):
+    elif alive_evil >= alive_good:
         game_state['winner'] = 'evil'
         game_state['phase'] = GamePhase.GAME_OVER.value
 
     return game_state
 
-def initialize_game_state() -> Dict:
+def initialize_game_state(rules: str = DEFAULT_RULES) -> Dict:
     """Create initial game state"""
     return {
+        'rules': rules,
         'players': [],
+        'player_index': {},
+        'role_index': {},
         'phase': GamePhase.LOBBY.value,
         'night_actions': {},
+        'votes': {},
+        'inspections': {'witch': {}, 'detective': {}},
         'deaths': [],
         'eliminated': None,
-        'winner': None
+        'winner': None,
+        # History record of the game in progress, set when it starts
+        'session_id': None,
+        # Wall-clock time the current phase ends, so another node can re-arm it
+        'deadline': None,
+        'version': 0
     }
@@ -0,0 +1,277 @@
+"""Match history, written to the database off the gameplay path.
+
+Socket handlers only enqueue plain dicts. One background task drains the
+queue in bounded batches and writes each batch in a worker thread with
+bulk inserts, so a slow database never delays a game.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from game import Role, faction
+from models import open_session, GameSession, PlayerRecord, GameAction, PlayerStats, RoleStats, create_tables
+
+# Most events written in one transaction, and the longest an event waits for company
+BATCH_SIZE = 500
+FLUSH_SECONDS = 1.0
+# Events beyond this are dropped rather than letting memory grow without bound
+MAX_PENDING = 50000
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def new_session_id(room_id: str) -> str:
+    """Room ids are reused between games, so each game gets its own session id"""
+    return f"{room_id}-{uuid.uuid4().hex[:8]}"
+
+def bump_counters(db: Session, model, key: str, rows: List[Dict]) -> None:
+    """Add each row's counters to the aggregate row with the same key, creating it if needed"""
+    if not rows:
+        return
+    upsert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(model)
+        stmt = stmt.on_conflict_do_update(index_elements=[key], set_={
+            name: getattr(model, name) + stmt.excluded[name] if name != 'last_played' else stmt.excluded[name]
+            for name in rows[0] if name != key
+        })
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        changes = {name: getattr(model, name) + value if name != 'last_played' else value
+                   for name, value in row.items() if name != key}
+        if not db.execute(update(model).where(getattr(model, key) == row[key]).values(changes)).rowcount:
+            db.execute(insert(model).values(row))
+
+
+class HistoryWriter:
+    def __init__(self, session_factory=open_session, batch_size: int = BATCH_SIZE,
+                 flush_seconds: float = FLUSH_SECONDS, max_pending: int = MAX_PENDING):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self._task: Optional[asyncio.Task] = None
+        # session_id -> game_sessions.id; only touched from the writer thread
+        self._session_ids: Dict[str, int] = {}
+
+    def game_started(self, state: Dict) -> None:
+        self._put({
+            'kind': 'start',
+            'session_id': state['session_id'],
+            'player_count': len(state['players']),
+            'time': datetime.utcnow()
+        })
+
+    def action(self, state: Dict, action_type: str, player_sid: str, target_sid: Optional[str] = None,
+               phase: Optional[str] = None, details: Optional[str] = None) -> None:
+        self._put({
+            'kind': 'action',
+            'session_id': state['session_id'],
+            'action_type': action_type,
+            'player_sid': player_sid,
+            'target_sid': target_sid,
+            'phase': phase or state['phase'],
+            'details': details,
+            'time': datetime.utcnow()
+        })
+
+    def game_finished(self, state: Dict) -> None:
+        self._put({
+            'kind': 'finish',
+            'session_id': state['session_id'],
+            'winner': state.get('winner'),
+            'players': [(p.name, p.role.value if p.role else None, p.alive, p.is_ai) for p in state['players']],
+            'time': datetime.utcnow()
+        })
+
+    def pending(self) -> int:
+        """Events queued but not yet written"""
+        return self._queue.qsize()
+
+    def _put(self, event: Dict) -> None:
+        if not event['session_id']:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logging.warning(f"History queue full, {self.dropped} events dropped so far")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(create_tables)
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                logging.exception(f"Failed to write {len(batch)} history events")
+                # Ids cached by the failed transaction may have been rolled back
+                self._session_ids.clear()
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch: List[Dict]) -> None:
+        with self.session_factory() as db:
+            started = [GameSession(session_id=e['session_id'], start_time=e['time'], player_count=e['player_count'])
+                       for e in batch if e['kind'] == 'start']
+            if started:
+                db.add_all(started)
+                db.flush()
+                self._session_ids.update((s.session_id, s.id) for s in started)
+
+            # Sessions started by an earlier process are looked up once
+            missing = {e['session_id'] for e in batch} - self._session_ids.keys()
+            if missing:
+                rows = db.execute(select(GameSession.session_id, GameSession.id)
+                                  .where(GameSession.session_id.in_(missing)))
+                self._session_ids.update(rows.tuples())
+
+            actions = [{
+                'game_session_id': self._session_ids[e['session_id']],
+                'action_type': e['action_type'],
+                'player_sid': e['player_sid'],
+                'target_sid': e['target_sid'],
+                'phase': e['phase'],
+                'timestamp': e['time'],
+                'details': e['details']
+            } for e in batch if e['kind'] == 'action' and e['session_id'] in self._session_ids]
+            if actions:
+                db.execute(insert(GameAction), actions)
+
+            records = []
+            player_totals = defaultdict(lambda: {'games': 0, 'wins': 0, 'survived': 0, 'last_played': None})
+            role_totals = defaultdict(lambda: {'games': 0, 'wins': 0})
+            for e in batch:
+                if e['kind'] != 'finish' or e['session_id'] not in self._session_ids:
+                    continue
+                game_session_id = self._session_ids.pop(e['session_id'])
+                db.execute(update(GameSession).where(GameSession.id == game_session_id)
+                           .values(end_time=e['time'], winner=e['winner']))
+                for name, role, alive, is_ai in e['players']:
+                    records.append({'game_session_id': game_session_id, 'player_name': name, 'role': role,
+                                    'is_alive': alive})
+                    won = role is not None and faction(Role(role)) == e['winner']
+                    role_totals[role]['games'] += 1
+                    role_totals[role]['wins'] += won
+                    if not is_ai:
+                        totals = player_totals[name]
+                        totals['games'] += 1
+                        totals['wins'] += won
+                        totals['survived'] += alive
+                        totals['last_played'] = e['time']
+            if records:
+                db.execute(insert(PlayerRecord), records)
+            bump_counters(db, PlayerStats, 'player_name',
+                          [{'player_name': name, **totals} for name, totals in player_totals.items()])
+            bump_counters(db, RoleStats, 'role',
+                          [{'role': role, **totals} for role, totals in role_totals.items() if role])
+            db.commit()
+
+    async def flush(self) -> None:
+        """Wait until everything queued so far has been written"""
+        if self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# Read side: every query below is served by an index or an aggregate row
+
+def _win_rate(wins: int, games: int) -> float:
+    return wins / games if games else 0.0
+
+def _session_dict(game: GameSession) -> Dict:
+    return {
+        'session_id': game.session_id,
+        'start_time': game.start_time.isoformat() if game.start_time else None,
+        'end_time': game.end_time.isoformat() if game.end_time else None,
+        'winner': game.winner,
+        'player_count': game.player_count,
+        'cursor': game.id
+    }
+
+def match_history(db: Session, player: Optional[str] = None, limit: int = 20,
+                  before: Optional[int] = None) -> List[Dict]:
+    """Newest games first, optionally only a player's; page with the last game's cursor"""
+    query = select(GameSession)
+    if player:
+        ids = select(PlayerRecord.game_session_id).where(PlayerRecord.player_name == player)
+        if before is not None:
+            ids = ids.where(PlayerRecord.game_session_id < before)
+        ids = ids.order_by(PlayerRecord.game_session_id.desc()).limit(limit)
+        query = query.where(GameSession.id.in_(ids))
+    elif before is not None:
+        query = query.where(GameSession.id < before)
+    games = db.scalars(query.order_by(GameSession.id.desc()).limit(limit))
+    return [_session_dict(game) for game in games]
+
+def game_detail(db: Session, session_id: str) -> Optional[Dict]:
+    game = db.scalars(select(GameSession).where(GameSession.session_id == session_id)).first()
+    if game is None:
+        return None
+    players = db.scalars(select(PlayerRecord).where(PlayerRecord.game_session_id == game.id))
+    actions = db.scalars(select(GameAction).where(GameAction.game_session_id == game.id)
+                         .order_by(GameAction.timestamp))
+    return {
+        **_session_dict(game),
+        'players': [{'name': p.player_name, 'role': p.role, 'alive': p.is_alive} for p in players],
+        'actions': [{
+            'action': a.action_type,
+            'player_sid': a.player_sid,
+            'target_sid': a.target_sid,
+            'phase': a.phase,
+            'timestamp': a.timestamp.isoformat() if a.timestamp else None
+        } for a in actions]
+    }
+
+def role_win_rates(db: Session) -> List[Dict]:
+    return [{'role': r.role, 'games': r.games, 'wins': r.wins, 'win_rate': _win_rate(r.wins, r.games)}
+            for r in db.scalars(select(RoleStats).order_by(RoleStats.role))]
+
+def _player_dict(stats: PlayerStats) -> Dict:
+    return {
+        'name': stats.player_name,
+        'games': stats.games,
+        'wins': stats.wins,
+        'survived': stats.survived,
+        'win_rate': _win_rate(stats.wins, stats.games),
+        'last_played': stats.last_played.isoformat() if stats.last_played else None
+    }
+
+def player_stats(db: Session, name: str) -> Optional[Dict]:
+    stats = db.get(PlayerStats, name)
+    return _player_dict(stats) if stats else None
+
+def leaderboard(db: Session, limit: int = 20, min_games: int = 1) -> List[Dict]:
+    """Most wins first, walking the wins index"""
+    query = (select(PlayerStats).where(PlayerStats.games >= min_games)
+             .order_by(PlayerStats.wins.desc(), PlayerStats.games).limit(limit))
+    return [_player_dict(stats) for stats in db.scalars(query)]
@@ -0,0 +1,88 @@
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Event -> (tokens per second, burst) for one socket
+SID_LIMITS: Dict[str, Tuple[float, float]] = {
+    'join_lobby': (0.5, 3),
+    'resume': (0.5, 3),
+    'spectate': (0.5, 3),
+    'request_snapshot': (1, 3),
+    'start_game': (0.2, 2),
+    'start_game_with_ai': (0.2, 2),
+    'night_action': (1, 4),
+    'vote': (1, 4)
+}
+
+# Event -> (tokens per second, burst) per seat, scaled by the table's capacity
+ROOM_LIMITS_PER_SEAT: Dict[str, Tuple[float, float]] = {
+    'start_game': (0.05, 0.5),
+    'start_game_with_ai': (0.05, 0.5),
+    'night_action': (0.5, 2),
+    'vote': (0.5, 2)
+}
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'rejected')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        # Requests refused since the last one let through
+        self.rejected = 0
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.rejected = 0
+            return True
+        self.rejected += 1
+        return False
+
+
+class RateLimiter:
+    """Token buckets per socket and per room, for each limited event.
+
+    A request must get a token from both its socket's bucket and its
+    room's bucket, so one client can't flood its table and one table
+    can't flood the node. Buckets are dropped with their socket or room.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}
+
+    def _bucket(self, key: str, event: str, rate: float, burst: float, now: float) -> TokenBucket:
+        buckets = self._buckets.setdefault(key, {})
+        bucket = buckets.get(event)
+        if bucket is None:
+            bucket = buckets[event] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def allow(self, event: str, sid: str, room_id: Optional[str] = None, capacity: int = 1) -> bool:
+        now = self.clock()
+        limit = SID_LIMITS.get(event)
+        if limit and not self._bucket(f"sid:{sid}", event, *limit, now).take(now):
+            return False
+        limit = ROOM_LIMITS_PER_SEAT.get(event)
+        if limit and room_id is not None:
+            rate, burst = limit
+            bucket = self._bucket(f"room:{room_id}", event, rate * capacity, max(1.0, burst * capacity), now)
+            if not bucket.take(now):
+                return False
+        return True
+
+    def first_rejection(self, event: str, sid: str) -> bool:
+        """Whether the socket was just refused for the first time in a row, so it is told only once"""
+        bucket = self._buckets.get(f"sid:{sid}", {}).get(event)
+        return bucket is None or bucket.rejected <= 1
+
+    def forget_sid(self, sid: str) -> None:
+        self._buckets.pop(f"sid:{sid}", None)
+
+    def forget_room(self, room_id: str) -> None:
+        self._buckets.pop(f"room:{room_id}", None)
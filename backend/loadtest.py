@@ -0,0 +1,316 @@
+"""Socket load test: many simulated players against one game server node.
+
+    python loadtest.py --tables 500
+    python loadtest.py --tables 2000 --table-size 12 --redis redis://localhost:6379 --json > load.json
+    python loadtest.py --tables 500 --baseline load.json
+    python loadtest.py --tables 500 --wire msgpack --baseline load.json
+    python loadtest.py --url http://localhost:8000 --tables 100
+
+Unless --url is given, a server is started on a free local port in a
+scratch directory, on in-memory state (or the Redis given by --redis), and
+stopped afterwards. Each table is one python-socketio client that plays
+the real event flow: join_lobby, start_game_with_ai, then a night_action
+(if its role has one) and a vote every round. It leaves once it has died,
+as a real player would, or sees game_over. Round trips are timed from
+each emit to its reply on the same socket.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import socketio
+from game import RULE_SETS, DEFAULT_RULES
+from bench import percentile
+from wire import FORMATS, socketio_serializer
+
+# Role -> night_action name a player of that role sends
+NIGHT_ACTIONS = {
+    'nightmare': 'kill',
+    'witch': 'witch_inspect',
+    'detective': 'detective_inspect',
+    'duant': 'duant_link'
+}
+
+# Emit -> the reply that completes its round trip
+REPLIES = {
+    'join_lobby': 'room_joined',
+    'start_game_with_ai': 'role_assigned',
+    'night_action': 'action_received',
+    'vote': 'vote_received'
+}
+
+# Longest wait for any server event; a day with no early finish lasts 60s
+EVENT_TIMEOUT = 90
+
+
+class Totals:
+    """Everything the simulated tables report, merged across all of them"""
+
+    def __init__(self):
+        self.connect_ms: List[float] = []
+        self.connect_failures = 0
+        self.round_trips: Dict[str, List[float]] = {event: [] for event in REPLIES}
+        self.sent: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.outcomes: Counter = Counter()
+
+
+class Table:
+    """One human seat at its own table, played by a socket client"""
+
+    def __init__(self, url: str, room_id: str, rules: str, table_size: Optional[int], totals: Totals,
+                 rng: random.Random, timeout: float, wire_format: str = 'json'):
+        self.url = url
+        self.room_id = room_id
+        self.rules = rules
+        self.table_size = table_size
+        self.totals = totals
+        self.rng = rng
+        self.timeout = timeout
+        self.client = socketio.AsyncClient(reconnection=False, serializer=socketio_serializer(wire_format))
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        # reply event -> (emitted event, perf_counter at emit)
+        self.pending: Dict[str, tuple] = {}
+        self.alive: Dict[str, bool] = {}
+        self.role: Optional[str] = None
+        for event in ('room_joined', 'role_assigned', 'phase_change', 'action_received', 'vote_received',
+                      'error', 'game_over'):
+            self.client.on(event, self._queued(event))
+        self.client.on('roster_snapshot', self._on_roster)
+        self.client.on('player_joined', self._on_roster)
+        self.client.on('player_died', self._on_died)
+
+    def _queued(self, event: str):
+        async def handler(data=None):
+            await self.inbox.put((event, data))
+        return handler
+
+    async def _on_roster(self, data):
+        for player in data['players']:
+            self.alive[player['sid']] = player['alive']
+
+    async def _on_died(self, data):
+        for sid in data['sids']:
+            self.alive[sid] = False
+
+    async def emit(self, event: str, data: Dict) -> None:
+        self.totals.sent[event] += 1
+        self.pending[REPLIES[event]] = (event, time.perf_counter())
+        await self.client.emit(event, data)
+
+    def target(self) -> Optional[str]:
+        others = [sid for sid, alive in self.alive.items() if alive and sid != self.client.get_sid()]
+        return self.rng.choice(others) if others else None
+
+    async def connect(self, gate: asyncio.Semaphore) -> bool:
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await self.client.connect(self.url, transports=['websocket'], wait_timeout=self.timeout)
+            except Exception as e:
+                self.totals.connect_failures += 1
+                self.totals.errors[f"connect: {type(e).__name__}"] += 1
+                return False
+            self.totals.connect_ms.append((time.perf_counter() - started) * 1000)
+            return True
+
+    async def play(self) -> None:
+        try:
+            await self.emit('join_lobby', {'name': f"load-{self.room_id[-6:]}", 'room_id': self.room_id,
+                                           'rules': self.rules})
+            self.totals.outcomes[await self._play()] += 1
+        finally:
+            await self.client.disconnect()
+
+    async def _play(self) -> str:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(self.inbox.get(), self.timeout)
+            except asyncio.TimeoutError:
+                self.totals.errors[f"timeout waiting after {', '.join(self.pending) or 'last reply'}"] += 1
+                return 'timed_out'
+
+            pending = self.pending.pop(event, None)
+            if pending is not None:
+                sent, started = pending
+                self.totals.round_trips[sent].append((time.perf_counter() - started) * 1000)
+
+            if event == 'error':
+                self.totals.errors[data.get('message', 'unknown')] += 1
+                self.pending.clear()
+                if not self.role:
+                    # Never got seated or started; nothing more to play
+                    return 'failed'
+            elif event == 'room_joined':
+                await self.emit('start_game_with_ai', {'table_size': self.table_size})
+            elif event == 'role_assigned':
+                self.role = data['role']
+            elif event == 'game_over':
+                return 'finished'
+            elif event == 'phase_change':
+                if not self.alive.get(self.client.get_sid(), True):
+                    return 'died'
+                target = self.target()
+                if target is None:
+                    continue
+                if data['phase'] == 'night' and self.role in NIGHT_ACTIONS:
+                    await self.emit('night_action', {'action': NIGHT_ACTIONS[self.role], 'target': target})
+                elif data['phase'] == 'day':
+                    await self.emit('vote', {'target': target})
+
+
+def summarize(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50),
+        'p95_ms': percentile(values, 95),
+        'p99_ms': percentile(values, 99),
+        'max_ms': values[-1] if values else 0
+    }
+
+async def run_load(url: str, tables: int, rules: str = DEFAULT_RULES, table_size: Optional[int] = None,
+                   connect_concurrency: int = 100, timeout: float = EVENT_TIMEOUT, seed: int = 0) -> Dict:
+    totals = Totals()
+    rng = random.Random(seed)
+    run_id = f"{int(time.time())}-{os.getpid()}"
+    # Speak whatever wire format the server was started with
+    with urllib.request.urlopen(f"{url}/", timeout=timeout) as response:
+        wire_format = json.load(response).get('wire_format', 'json')
+    players = [Table(url, f"load-{run_id}-{i}", rules, table_size, totals, random.Random(rng.random()), timeout,
+                     wire_format) for i in range(tables)]
+
+    started = time.perf_counter()
+    gate = asyncio.Semaphore(connect_concurrency)
+    connected = await asyncio.gather(*(table.connect(gate) for table in players))
+    connect_elapsed = time.perf_counter() - started
+    await asyncio.gather(*(table.play() for table, ok in zip(players, connected) if ok))
+    elapsed = time.perf_counter() - started
+
+    sent = sum(totals.sent.values())
+    errors = sum(totals.errors.values())
+    return {
+        'url': url,
+        'wire_format': wire_format,
+        'tables': tables,
+        'rules': rules,
+        'table_size': table_size,
+        'elapsed_s': elapsed,
+        'connections': {
+            'ok': len(totals.connect_ms),
+            'failed': totals.connect_failures,
+            'per_sec': len(totals.connect_ms) / connect_elapsed if connect_elapsed else 0.0,
+            **summarize(totals.connect_ms)
+        },
+        'round_trips': {event: summarize(values) for event, values in totals.round_trips.items()},
+        'sent': dict(totals.sent),
+        'errors': dict(totals.errors),
+        # Per request made: every emit plus every connection attempt
+        'error_rate': errors / (sent + tables) if sent + tables else 0.0,
+        'outcomes': dict(totals.outcomes)
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(redis_url: str, wire_format: str, workdir: str) -> Tuple[subprocess.Popen, str]:
+    """Run main:socket_app under uvicorn in workdir, so its log and databases land there"""
+    port = free_port()
+    env = dict(os.environ, MAFIA_REDIS_URL=redis_url, MAFIA_WIRE_FORMAT=wire_format)
+    log = open(os.path.join(workdir, 'server.out'), 'w')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:socket_app', '--app-dir', os.path.dirname(os.path.abspath(__file__)),
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}; see {log.name}")
+        try:
+            urllib.request.urlopen(f"{url}/health", timeout=1).close()
+            return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Server did not come up within 30s; see {log.name}")
+
+def raise_fd_limit() -> None:
+    # Each table holds a socket on both ends
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def print_report(report: Dict, baseline: Optional[Dict] = None) -> None:
+    connections = report['connections']
+    print(f"{report['tables']} tables against {report['url']} ({report['wire_format']}) in {report['elapsed_s']:.1f}s")
+    print(f"  connections: {connections['ok']} ok, {connections['failed']} failed, "
+          f"{connections['per_sec']:.0f}/s, p50 {connections['p50_ms']:.1f}ms, p99 {connections['p99_ms']:.1f}ms")
+    print(f"  {'event':<20} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+          + (f" {'p95 vs base':>12}" if baseline else ''))
+    for event, stats in report['round_trips'].items():
+        line = (f"  {event:<20} {stats['count']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+        before = (baseline or {}).get('round_trips', {}).get(event)
+        if before and before['p95_ms']:
+            line += f" {(stats['p95_ms'] / before['p95_ms'] - 1):>+12.1%}"
+        print(line)
+    print(f"  error rate {report['error_rate']:.2%}; outcomes {report['outcomes']}")
+    for message, count in sorted(report['errors'].items(), key=lambda item: -item[1]):
+        print(f"    {count:>7}  {message}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive simulated socket clients against a game server")
+    parser.add_argument('--tables', type=int, default=200, help="concurrent tables, one client each")
+    parser.add_argument('--table-size', type=int, default=None)
+    parser.add_argument('--rules', choices=sorted(RULE_SETS), default=DEFAULT_RULES)
+    parser.add_argument('--url', default=None, help="test a running server instead of starting one")
+    parser.add_argument('--redis', default='', help="Redis URL for the started server (default: in-memory)")
+    parser.add_argument('--wire', choices=FORMATS, default='json', help="wire format of the started server")
+    parser.add_argument('--connect-concurrency', type=int, default=100, help="connections opened at once")
+    parser.add_argument('--timeout', type=float, default=EVENT_TIMEOUT, help="seconds to wait for any event")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=None, help="JSON report of an earlier run to compare against")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    server = None
+    with tempfile.TemporaryDirectory(prefix='mafia-load-') as workdir:
+        url = args.url
+        if url is None:
+            server, url = start_server(args.redis, args.wire, workdir)
+        try:
+            report = asyncio.run(run_load(url, args.tables, args.rules, args.table_size,
+                                          args.connect_concurrency, args.timeout, args.seed))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    report['backend'] = 'external' if args.url else ('redis' if args.redis else 'memory')
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        print_report(report, baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,100 @@
-from fastapi import FastAPI
+import time
+# Startup is timed from here, so the heavy imports below count against the budget
+IMPORT_STARTED = time.perf_counter()
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import socketio
 import asyncio
+import functools
+import os
+import queue
+import secrets
 import uvicorn
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
 try:
-    from .game import assign_roles, start_night_phase, process_night_actions, process_votes, check_win_conditions, GamePhase
-    from .state import game_state_manager
+    from .game import assign_roles, index_players, start_game_with_ai as add_ai_players, start_night_phase, check_win_conditions, night_actions_complete, start_day_phase, votes_complete, get_player, get_rule_set, GamePhase, RULE_SETS, DEFAULT_RULES
+    from .state import (NIGHT_ACTION_FIELDS, REDIS_URL, backend_healthy, close_backend, connect_backend,
+                        create_game_state_manager, recover_rooms, redis_reachable)
+    from .cluster import LEASE_SECONDS, create_cluster
+    from .history import (HistoryWriter, new_session_id, match_history, game_detail, role_win_rates,
+                          player_stats, leaderboard)
+    from .models import get_db, create_tables
+    from .rooms import RoomRegistry
+    from .scheduler import PhaseScheduler
+    from .ai import run_night, run_day
+    from .limits import RateLimiter
+    from .views import PUBLIC, VIEW_ROLES, ViewCache, view_room, views_for
+    from .spectators import SpectatorFeed
+    from .wire import WIRE_FORMAT, socketio_serializer
+    from .metrics import REGISTRY, FANOUT_BUCKETS, PHASE_BUCKETS, counter, gauge, histogram
 except ImportError:
     # Fallback for direct execution
     import sys
-    import os
     sys.path.append(os.path.dirname(__file__))
-    from game import assign_roles, start_night_phase, process_night_actions, process_votes, check_win_conditions, GamePhase
-    from state import game_state_manager
+    from game import assign_roles, index_players, start_game_with_ai as add_ai_players, start_night_phase, check_win_conditions, night_actions_complete, start_day_phase, votes_complete, get_player, get_rule_set, GamePhase, RULE_SETS, DEFAULT_RULES
+    from state import (NIGHT_ACTION_FIELDS, REDIS_URL, backend_healthy, close_backend, connect_backend,
+                       create_game_state_manager, recover_rooms, redis_reachable)
+    from cluster import LEASE_SECONDS, create_cluster
+    from history import (HistoryWriter, new_session_id, match_history, game_detail, role_win_rates,
+                         player_stats, leaderboard)
+    from models import get_db, create_tables
+    from rooms import RoomRegistry
+    from scheduler import PhaseScheduler
+    from ai import run_night, run_day
+    from limits import RateLimiter
+    from views import PUBLIC, VIEW_ROLES, ViewCache, view_room, views_for
+    from spectators import SpectatorFeed
+    from wire import WIRE_FORMAT, socketio_serializer
+    from metrics import REGISTRY, FANOUT_BUCKETS, PHASE_BUCKETS, counter, gauge, histogram
 
 import logging
+import logging.handlers
 
-# Logging setup
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-file_handler = logging.FileHandler('mafia.log')
-file_handler.setLevel(logging.INFO)
+# Logging setup: handlers only put records on a queue, and a listener thread
+# does the formatting and the console and mafia.log writes off the event loop
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-logging.getLogger().addHandler(file_handler)
-
-app = FastAPI(title="Mafia Game Server", version="1.0.0")
+stream_handler = logging.StreamHandler()
+file_handler = logging.FileHandler('mafia.log')
+for log_handler in (stream_handler, file_handler):
+    log_handler.setLevel(logging.INFO)
+    log_handler.setFormatter(formatter)
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+# The listener's handlers do all the formatting, so the queue carries bare messages
+logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[logging.handlers.QueueHandler(log_queue)])
+log_listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+log_listener.start()
+
+# Autoscaled workers should be taking traffic within this many seconds of starting
+STARTUP_BUDGET_SECONDS = float(os.environ.get('MAFIA_STARTUP_BUDGET', 1.0))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect the state backend and history database, then adopt orphaned games, before serving"""
+    started = time.perf_counter()
+    await asyncio.gather(connect_state(), asyncio.to_thread(create_tables))
+    await resume_games()
+    ready = time.perf_counter()
+    STARTUP_SECONDS.set(started - IMPORT_STARTED, stage='import')
+    STARTUP_SECONDS.set(ready - started, stage='lifespan')
+    message = (f"Ready in {(ready - IMPORT_STARTED) * 1000:.0f}ms (import {(started - IMPORT_STARTED) * 1000:.0f}ms, "
+               f"startup {(ready - started) * 1000:.0f}ms) on {'Redis' if redis_client is not None else 'in-memory state'}")
+    if ready - IMPORT_STARTED > STARTUP_BUDGET_SECONDS:
+        logging.warning(f"{message}, over the {STARTUP_BUDGET_SECONDS}s budget")
+    else:
+        logging.info(message)
+    yield
+    if recovery_task is not None:
+        recovery_task.cancel()
+    await cluster.stop()
+    # Write out queued history, including the rows that close finished games
+    await history.stop()
+    await close_backend()
+    log_listener.stop()
+
+app = FastAPI(title="Mafia Game Server", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -35,174 +105,833 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# SocketIO server
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins=['http://localhost:3000'])
+# SocketIO server; with Redis, emits go through its pub/sub so every worker
+# delivers them to its own sockets. The wire format is per server rather than
+# per socket, so each broadcast is still encoded once for the whole room.
+sio = socketio.AsyncServer(async_mode='asgi', serializer=socketio_serializer(),
+                           cors_allowed_origins=['http://localhost:3000'])
 socket_app = socketio.ASGIApp(sio, app)
 
+# Shared async Redis client, or None on in-memory state; set by connect_state() at startup
+redis_client = None
+
+# Each room's logic runs on the one node that owns it; a single node until startup finds Redis
+cluster = create_cluster(None)
+# sid -> owning node, for our sockets seated in a room owned elsewhere
+remote_rooms: Dict[str, str] = {}
+# sid -> home node, for players of our rooms connected to another node
+remote_sids: Dict[str, str] = {}
+ROUTED_HANDLERS = {}
+
+# Every table hosted by this process, keyed by room_id
+rooms = RoomRegistry(create_game_state_manager)
+
+# Phase lengths in seconds; one scheduler loop drives every room's deadline
+NIGHT_SECONDS = 10
+DAY_SECONDS = 60
+PHASE_SECONDS = {GamePhase.NIGHT.value: NIGHT_SECONDS, GamePhase.DAY.value: DAY_SECONDS}
+scheduler = PhaseScheduler()
+
+# Projected views per room and state version
+views = ViewCache()
+
+# Match history, written in the background
+history = HistoryWriter()
+
+# Token buckets per socket and per room for client events
+limiter = RateLimiter()
+
+# How long a dropped player's seat is held for them to resume it
+GRACE_SECONDS = 30
+grace_timers = PhaseScheduler()
+# Sockets that resumed a seat: socket sid -> seat sid, and seat sid -> socket sid.
+# A seat keeps the sid it joined with; its current socket is in that sid's room.
+seats: Dict[str, str] = {}
+seat_sockets: Dict[str, str] = {}
+
+# Spectators see a table's public events this many seconds late, so they can't
+# feed live information back to the players; 0 streams them as they happen
+SPECTATOR_DELAY_SECONDS = float(os.environ.get('MAFIA_SPECTATOR_DELAY', 0))
+# room_id -> public feed, for tables somebody has watched
+spectator_feeds: Dict[str, SpectatorFeed] = {}
+# sid -> room_id, for sockets watching one of our tables
+watching: Dict[str, str] = {}
+
+# Metrics served at /metrics
+HANDLER_SECONDS = histogram('mafia_handler_seconds', "Time spent handling a socket event", ('event',))
+HANDLER_ERRORS = counter('mafia_handler_errors_total', "Socket events whose handler raised", ('event',))
+EMITS = counter('mafia_room_emits_total', "Events broadcast to a whole table", ('event',))
+EMIT_FANOUT = histogram('mafia_room_emit_fanout', "Sockets reached by one table broadcast", ('event',), FANOUT_BUCKETS)
+PHASE_DURATION = histogram('mafia_phase_seconds', "How long night and day phases actually last", ('phase',),
+                           PHASE_BUCKETS)
+SOCKETS = gauge('mafia_sockets', "Sockets connected to this node")
+STARTUP_SECONDS = gauge('mafia_startup_seconds', "Time this worker took to start, by stage", ('stage',))
+RESUMES = counter('mafia_resumes_total', "Seat resumes, by how the client was brought up to date", ('outcome',))
+SPECTATOR_EMITS = counter('mafia_spectator_emits_total', "Events relayed to a table's spectators", ('event',))
+gauge('mafia_spectators', "Sockets on this node watching a table",
+      callback=lambda: sum(len(sids) for name, sids in sio.manager.rooms.get('/', {}).items()
+                           if name and name.endswith(':spectators')))
+gauge('mafia_spectator_backlog', "Events waiting out the spectator delay",
+      callback=lambda: sum(feed.pending() for feed in spectator_feeds.values()))
+gauge('mafia_seats_held', "Seats held for players who dropped", callback=grace_timers.pending)
+gauge('mafia_rooms', "Tables hosted by this node", callback=lambda: len(rooms.rooms))
+gauge('mafia_games_active', "Tables on this node with a game under way",
+      callback=lambda: sum(room.started for room in rooms.rooms.values()))
+gauge('mafia_phase_timers', "Phase deadlines waiting to fire", callback=scheduler.pending)
+gauge('mafia_history_backlog', "Match history events not yet written", callback=history.pending)
+
+async def get_room(sid):
+    """Look up the sender's room, reporting an error if they have none"""
+    room = rooms.room_for_sid(sid)
+    if room is None:
+        await sio.emit('error', {'message': 'Join a room first'}, to=sid)
+    return room
+
+async def broadcast(room, event: str, payload: Dict, skip_sid: Optional[str] = None):
+    """Emit an event to everyone at the table"""
+    EMITS.inc(event=event)
+    EMIT_FANOUT.observe(len(room.members) - (skip_sid in room.members), event=event)
+    await sio.emit(event, payload, to=room.room_id, skip_sid=skip_sid)
+
+async def publish(room, event: str, payload: Dict, skip_sid: Optional[str] = None):
+    """Broadcast a sequenced table event, kept so resuming clients get what they missed"""
+    room.seq += 1
+    payload['seq'] = room.seq
+    room.recent.append((room.seq, event, payload))
+    feed = spectator_feeds.get(room.room_id)
+    if feed is not None:
+        feed.push(event, payload)
+    await broadcast(room, event, payload, skip_sid)
+
+async def emit_to_spectators(event: str, payload: Dict, to: str):
+    SPECTATOR_EMITS.inc(event=event)
+    await sio.emit(event, payload, to=to)
+
+def timed(handler):
+    """Record how long each call of a socket event handler takes"""
+    event = handler.__name__
+    @functools.wraps(handler)
+    async def wrapper(sid, data=None):
+        started = time.perf_counter()
+        try:
+            await handler(sid, data)
+        except Exception:
+            HANDLER_ERRORS.inc(event=event)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, event=event)
+    return wrapper
+
+def routed(handler):
+    """Run a room-bound handler on the node that owns the sender's room"""
+    # Timed where it runs, so forwarded events count on the owning node
+    handler = timed(handler)
+    @functools.wraps(handler)
+    async def local(sid, data=None):
+        # A socket that resumed a seat acts as that seat
+        await handler(seats.get(sid, sid), data)
+    @functools.wraps(handler)
+    async def wrapper(sid, data=None):
+        owner = remote_rooms.get(sid)
+        if owner is not None:
+            await cluster.forward(owner, handler.__name__, sid, data)
+        else:
+            await local(sid, data)
+    ROUTED_HANDLERS[handler.__name__] = local
+    return wrapper
+
+def limited(handler):
+    """Drop a client event once its socket or room runs out of tokens"""
+    @functools.wraps(handler)
+    async def wrapper(sid, data=None):
+        room = rooms.room_for_sid(sid)
+        event = handler.__name__
+        if not limiter.allow(event, sid, room.room_id if room else None, room.capacity if room else 1):
+            if limiter.first_rejection(event, sid):
+                await sio.emit('error', {'message': 'Too many requests, slow down'}, to=sid)
+            return
+        await handler(sid, data)
+    return wrapper
+
+async def on_forwarded(event: str, sid: str, data, origin: str):
+    """Handle an event another node forwarded to us as a room owner or home node"""
+    if event == 'enter_room':
+        await sio.enter_room(sid, data)
+        return
+    if event == 'unroute':
+        # The owner turned down the socket's join; its events are ours to handle again
+        if remote_rooms.get(sid) == origin:
+            del remote_rooms[sid]
+        return
+    arriving = sid not in remote_sids
+    remote_sids[sid] = origin
+    if event == 'disconnect':
+        await disconnect(sid)
+        remote_sids.pop(sid, None)
+        return
+    try:
+        await ROUTED_HANDLERS[event](sid, data)
+    finally:
+        if arriving and rooms.room_for_sid(seats.get(sid, sid)) is None and sid not in watching:
+            # Refused a join from another node's socket: stop tracking it and tell its home node
+            remote_sids.pop(sid, None)
+            limiter.forget_sid(sid)
+            await cluster.forward(origin, 'unroute', sid)
+
+cluster.on_message(on_forwarded)
+
+async def connect_state():
+    """Pick the state backend, and with Redis route socket emits and room ownership through it"""
+    global redis_client, cluster
+    redis_client = await connect_backend()
+    if redis_client is None:
+        return
+    # The server starts its manager on the first connection, so it can still be swapped here
+    sio.manager = socketio.AsyncRedisManager(REDIS_URL)
+    sio.manager.set_server(sio)
+    await cluster.stop()
+    cluster = create_cluster(redis_client)
+    cluster.on_message(on_forwarded)
+
+def socket_for(seat: str) -> str:
+    """The socket currently playing a seat"""
+    return seat_sockets.get(seat, seat)
+
+def new_resume_token(room_id: str) -> str:
+    # The room id up front lets any node route the resume to the room's owner
+    return f"{room_id}:{secrets.token_urlsafe(16)}"
+
+async def enter_room(sid: str, room_name: str):
+    """Join a socket to a Socket.IO room on whichever node holds the socket"""
+    home = remote_sids.get(sid)
+    if home is not None:
+        await cluster.forward(home, 'enter_room', sid, room_name)
+    else:
+        await sio.enter_room(sid, room_name)
+
+def set_deadline(state: Dict) -> None:
+    """Stamp when the current phase ends, inside the transaction that starts it"""
+    seconds = PHASE_SECONDS.get(state['phase'])
+    state['deadline'] = time.time() + seconds if seconds else None
+
+def observe_phase(phase: str, deadline: Optional[float]) -> None:
+    """Record how long a phase that just ended lasted, from the deadline it started with"""
+    if deadline:
+        PHASE_DURATION.observe(time.time() - (deadline - PHASE_SECONDS[phase]), phase=phase)
+
+def arm_timer(room_id: str, state: Dict) -> None:
+    """Schedule the end of the room's current phase at its stored deadline"""
+    if state['phase'] == GamePhase.NIGHT.value:
+        callback = end_night_phase
+    elif state['phase'] == GamePhase.DAY.value:
+        callback = end_day_phase
+    else:
+        return
+    deadline = state.get('deadline')
+    delay = max(0.0, deadline - time.time()) if deadline else PHASE_SECONDS[state['phase']]
+    scheduler.schedule(room_id, delay, callback)
+
+async def discard_room(room_id: str):
+    await rooms.discard(room_id)
+    scheduler.cancel(room_id)
+    views.drop(room_id)
+    # The feed still relays what it holds, e.g. a delayed game_over
+    spectator_feeds.pop(room_id, None)
+    limiter.forget_room(room_id)
+    await cluster.release(room_id)
+
+async def finish_game(room, state: Dict):
+    history.game_finished(state)
+    await publish(room, 'game_over', {'winner': state['winner']})
+    if not room.members:
+        # A recovered game nobody came back to
+        await discard_room(room.room_id)
+
+async def send_snapshot(room, sid: str):
+    """Send one client the full public roster and phase, tagged with the current sequence"""
+    state = await room.state_manager.get_game_state()
+    public = views.get(room.room_id, PUBLIC, state)
+    await sio.emit('roster_snapshot', {'seq': room.seq, 'phase': public['phase'], 'players': public['players']},
+                   to=sid)
+
+async def deal_roles(room, state: Dict):
+    """Tell each human their role and seat them in their view rooms"""
+    humans = [p for p in state['players'] if not p.is_ai and p.sid in room.members]
+    await asyncio.gather(*(enter_room(socket_for(p.sid), view_room(room.room_id, view))
+                           for p in humans for view in views_for(p)))
+    await asyncio.gather(*(sio.emit('role_assigned', {
+        'role': p.role.value if p.role else None,
+        'name': p.name
+    }, to=p.sid) for p in humans))
+    await send_private_views(room, state)
+
+async def send_private_views(room, state: Dict):
+    """Emit each private view once to its view room, all in parallel"""
+    await asyncio.gather(*(sio.emit('private_view', {'view': view, **views.get(room.room_id, view, state)},
+                                    to=view_room(room.room_id, view))
+                           for view in VIEW_ROLES))
+
 # WebSocket event handlers
 @sio.event
 async def connect(sid, environ):
     logging.info(f"Client {sid} connected")
+    SOCKETS.inc()
     await sio.emit('message', {'data': 'Connected to Mafia Game Server'}, to=sid)
 
 @sio.event
 async def disconnect(sid):
     logging.info(f"Client {sid} disconnected")
-    game_state_manager.remove_player(sid)
-    await sio.emit('lobby_update', game_state_manager.get_players_dict())
+    if sid not in remote_sids:
+        SOCKETS.dec()
+    owner = remote_rooms.pop(sid, None)
+    if owner is not None:
+        await cluster.forward(owner, 'disconnect', sid)
+        return
+    watching.pop(sid, None)
+    seat = seats.pop(sid, sid)
+    if socket_for(seat) != sid:
+        # An old socket of a seat that has since been resumed elsewhere
+        return
+    seat_sockets.pop(seat, None)
+    if rooms.room_for_sid(seat) is None:
+        limiter.forget_sid(seat)
+        return
+    # Hold the seat for a while so a network blip doesn't cost the player their game
+    grace_timers.schedule(seat, GRACE_SECONDS, release_seat)
+
+async def release_seat(seat: str):
+    """Give up a dropped player's seat once its grace window runs out"""
+    limiter.forget_sid(seat)
+    room = await rooms.leave(seat)
+    if room is None:
+        return
+    if room.room_id not in rooms.rooms:
+        # Last human left; stop driving the table
+        scheduler.cancel(room.room_id)
+        views.drop(room.room_id)
+        spectator_feeds.pop(room.room_id, None)
+        limiter.forget_room(room.room_id)
+        await cluster.release(room.room_id)
+        return
+    await room.state_manager.remove_player(seat)
+    await publish(room, 'player_left', {'sid': seat})
 
 @sio.event
+@routed
+@limited
 async def join_lobby(sid, data):
     """Handle player joining lobby"""
     name = data.get('name', f'Player_{sid[:4]}')
-    logging.info(f"Player {name} joined lobby")
+    if rooms.room_for_sid(sid) is not None:
+        await sio.emit('error', {'message': 'Already in a room'}, to=sid)
+        return
+    rules = data.get('rules') or DEFAULT_RULES
+    if rules not in RULE_SETS:
+        await sio.emit('error', {'message': f"Unknown rule set '{rules}'"}, to=sid)
+        return
+    requested = data.get('room_id')
+    if requested and rooms.get(requested) is None:
+        owner = await cluster.claim(requested)
+        if owner != cluster.node_id:
+            if sid in remote_sids:
+                # Sent on by the socket's home node, which only routes it to one owner
+                await sio.emit('error', {'message': 'Room is unavailable, please try again'}, to=sid)
+                return
+            # The table lives on another node; let it seat the player, or turn them down and unroute them
+            remote_rooms[sid] = owner
+            await cluster.forward(owner, 'join_lobby', sid, data)
+            return
+    room = rooms.join(sid, requested, rules)
+    if room is None:
+        await sio.emit('error', {'message': 'Room is full or already playing'}, to=sid)
+        return
+    # Matchmade rooms are new or already ours; claim answers from our own leases for the latter
+    await cluster.claim(room.room_id)
+
+    resume_token = new_resume_token(room.room_id)
+    if not await room.state_manager.add_player(sid, name, resume_token):
+        # Another worker filled the table first
+        await rooms.leave(sid)
+        await sio.emit('error', {'message': 'Room is full or already playing'}, to=sid)
+        return
 
-    game_state_manager.add_player(sid, name)
-    players = game_state_manager.get_players_dict()
+    logging.info(f"Player {name} joined lobby {room.room_id}")
+    await enter_room(sid, room.room_id)
+    await sio.emit('room_joined', {'room_id': room.room_id, 'rules': room.rules, 'capacity': room.capacity,
+                                   'resume_token': resume_token, 'epoch': room.epoch}, to=sid)
 
-    await sio.emit('lobby_update', players)
+    state = await room.state_manager.get_game_state()
+    player = get_player(state, sid)
+    await publish(room, 'player_joined', {'players': [player.to_public_dict()]}, skip_sid=sid)
+    await send_snapshot(room, sid)
 
-    # Check if we have 7 players to start
-    if len(players) == 7:
-        await sio.emit('ready_to_start', {'message': 'All players joined! Ready to start game.'})
+    # Check if the table is full
+    if len(state['players']) == room.capacity:
+        await publish(room, 'ready_to_start', {'message': 'All players joined! Ready to start game.'})
+
+@sio.event
+@routed
+@limited
+async def resume(sid, data):
+    """Take a seat back on a new socket after a drop, sending only the table events missed"""
+    token = data.get('token') or ''
+    room_id = token.rpartition(':')[0]
+    if not room_id:
+        await sio.emit('error', {'message': 'Invalid resume token'}, to=sid)
+        return
+    if rooms.get(room_id) is None and redis_client is not None:
+        owner = await cluster.claim(room_id)
+        if owner != cluster.node_id:
+            if sid in remote_sids:
+                await sio.emit('error', {'message': 'Room is unavailable, please try again'}, to=sid)
+                return
+            remote_rooms[sid] = owner
+            await cluster.forward(owner, 'resume', sid, data)
+            return
+        # Ours now; the game may be one whose node went away
+        await recover_games()
+    room = rooms.get(room_id)
+    state = await room.state_manager.get_game_state() if room else None
+    seat = (state.get('resume_tokens') or {}).get(token) if state else None
+    player = get_player(state, seat) if seat else None
+    if player is None:
+        if room is None and redis_client is not None:
+            await cluster.release(room_id)
+        RESUMES.inc(outcome='expired')
+        await sio.emit('error', {'message': 'Session expired, please join again'}, to=sid)
+        return
+
+    grace_timers.cancel(seat)
+    previous = socket_for(seat)
+    seats.pop(previous, None)
+    if sid != seat:
+        seats[sid] = seat
+        seat_sockets[seat] = sid
+        # Emits addressed to the seat reach whichever socket plays it
+        await enter_room(sid, seat)
+    rooms.seat(seat, room_id)
+    await enter_room(sid, room_id)
+    await asyncio.gather(*(enter_room(sid, view_room(room_id, view)) for view in views_for(player)))
+    logging.info(f"Player {player.name} resumed in room {room_id}")
+    await sio.emit('room_joined', {'room_id': room_id, 'rules': room.rules, 'capacity': room.capacity,
+                                   'resume_token': token, 'epoch': room.epoch, 'resumed': True}, to=sid)
+
+    seq = data.get('seq')
+    # A seq counted by an earlier run of the room, e.g. before it was recovered here, means nothing now
+    missed = room.missed_since(data.get('epoch'), seq) if isinstance(seq, int) else None
+    if missed is None:
+        RESUMES.inc(outcome='snapshot')
+        await send_snapshot(room, sid)
+    else:
+        RESUMES.inc(outcome='replayed')
+        for _, event, payload in missed:
+            await sio.emit(event, payload, to=sid)
+    if player.role:
+        await sio.emit('role_assigned', {'role': player.role.value, 'name': player.name}, to=sid)
+        for view in views_for(player):
+            await sio.emit('private_view', {'view': view, **views.get(room_id, view, state)}, to=sid)
+
+@sio.event
+@routed
+@limited
+async def spectate(sid, data):
+    """Watch a table's public events, without a seat and after the spectator delay"""
+    room_id = data.get('room_id')
+    if not room_id:
+        await sio.emit('error', {'message': 'Choose a room to watch'}, to=sid)
+        return
+    if rooms.room_for_sid(sid) is not None:
+        await sio.emit('error', {'message': 'Already in a room'}, to=sid)
+        return
+    if rooms.get(room_id) is None and redis_client is not None:
+        owner = await cluster.claim(room_id)
+        if owner != cluster.node_id:
+            if sid in remote_sids:
+                # Sent on by the socket's home node, which only routes it to one owner
+                await sio.emit('error', {'message': 'Already watching another room'}, to=sid)
+                return
+            # The owner queues the spectator on its feed and joins them to the room from there.
+            # Their disconnect is forwarded too, so the owner can drop what it keeps per socket.
+            # A refusal unroutes them again.
+            remote_rooms[sid] = owner
+            await cluster.forward(owner, 'spectate', sid, data)
+            return
+        await recover_games()
+    room = rooms.get(room_id)
+    if room is None:
+        if redis_client is not None:
+            await cluster.release(room_id)
+        await sio.emit('error', {'message': 'Room not found'}, to=sid)
+        return
+
+    feed = spectator_feeds.get(room_id)
+    if feed is None:
+        feed = spectator_feeds[room_id] = SpectatorFeed(room_id, SPECTATOR_DELAY_SECONDS, emit_to_spectators,
+                                                        enter_room)
+    state = await room.state_manager.get_game_state()
+    public = views.get(room_id, PUBLIC, state)
+    # Taken now and sent once the delay has passed, so the feed picks up right after it
+    feed.admit(sid, {'seq': room.seq, 'phase': public['phase'], 'players': public['players']})
+    watching[sid] = room_id
+    logging.info(f"Client {sid} is watching room {room_id}")
+    await sio.emit('spectating', {'room_id': room_id, 'rules': room.rules, 'capacity': room.capacity,
+                                  'delay': feed.delay}, to=sid)
+
+@sio.event
+@routed
+@limited
+async def request_snapshot(sid, data):
+    """Resync a client that missed a roster delta"""
+    room = await get_room(sid)
+    if room is not None:
+        await send_snapshot(room, sid)
 
 @sio.event
+@routed
+@limited
 async def start_game(sid, data):
     """Handle game start"""
-    state = game_state_manager.get_game_state()
-    if len(state['players']) != 7:
-        await sio.emit('error', {'message': 'Need exactly 7 players to start'}, to=sid)
+    room = await get_room(sid)
+    if room is None:
         return
 
-    logging.info("Game starting...")
-    assign_roles(state['players'])
-    game_state_manager.update_phase(GamePhase.ROLE_ASSIGNMENT)
+    def begin(state):
+        # Checked inside the transaction so a concurrent join or start can't slip past it
+        rules = get_rule_set(state)
+        if not rules.min_players <= len(state['players']) <= rules.max_players:
+            return False
+        if state['phase'] != GamePhase.LOBBY.value:
+            return False
+        assign_roles(state['players'], rules)
+        index_players(state)
+        start_night_phase(state)
+        set_deadline(state)
+        state['session_id'] = new_session_id(room.room_id)
+        return True
+
+    state = await room.state_manager.update_game_state(begin)
+    if state is None:
+        rules = RULE_SETS[room.rules]
+        await sio.emit('error', {'message': f'Need {rules.min_players}-{rules.max_players} players to start'}, to=sid)
+        return
 
-    # Send roles to players privately
-    for player in state['players']:
-        await sio.emit('role_assigned', {
-            'role': player.role.value if player.role else None,
-            'name': player.name
-        }, to=player.sid)
+    logging.info(f"Game starting in room {room.room_id}...")
+    rooms.mark_started(room.room_id)
+    history.game_started(state)
 
-    # Start night phase
-    start_night_phase(state)
-    game_state_manager.save_game_state(state)
+    # Send roles to players privately
+    await deal_roles(room, state)
 
-    await sio.emit('phase_change', {'phase': 'night', 'message': 'Night phase begins!'})
-    asyncio.create_task(end_night_after_delay(10))
+    await publish(room, 'phase_change', {'phase': 'night', 'message': 'Night phase begins!'})
+    arm_timer(room.room_id, state)
 
 @sio.event
+@routed
+@limited
 async def start_game_with_ai(sid, data):
     """Handle game start with AI"""
-    state = game_state_manager.get_game_state()
-    num_players = len(state['players'])
-    if num_players < 1:
+    room = await get_room(sid)
+    if room is None:
+        return
+    table_size = data.get('table_size')
+    table_size = table_size if isinstance(table_size, int) else None
+
+    def begin(state):
+        if len(state['players']) < 1 or state['phase'] != GamePhase.LOBBY.value:
+            return False
+        add_ai_players(state, table_size)
+        start_night_phase(state)
+        set_deadline(state)
+        state['session_id'] = new_session_id(room.room_id)
+        return True
+
+    state = await room.state_manager.update_game_state(begin)
+    if state is None:
         await sio.emit('error', {'message': 'At least one human player is required'}, to=sid)
         return
 
-    logging.info("Starting game with AI...")
-    from game import start_game_with_ai as start_game_with_ai_func
-    start_game_with_ai_func(state)
-    game_state_manager.save_game_state(state) # Save state after adding AI
-    await sio.emit('lobby_update', game_state_manager.get_players_dict()) # Update lobby
+    logging.info(f"Starting game with AI in room {room.room_id}...")
+    rooms.mark_started(room.room_id)
+    history.game_started(state)
+    await publish(room, 'player_joined', {'players': [p.to_public_dict() for p in state['players'] if p.is_ai]})
     await sio.sleep(1) # Give frontend time to update
 
-    game_state_manager.update_phase(GamePhase.ROLE_ASSIGNMENT)
-
     # Send roles to players privately
-    for player in state['players']:
-        if not player.is_ai:
-            await sio.emit('role_assigned', {
-                'role': player.role.value if player.role else None,
-                'name': player.name
-            }, to=player.sid)
+    await deal_roles(room, state)
 
-    # Start night phase
-    start_night_phase(state)
-    game_state_manager.save_game_state(state)
-
-    await sio.emit('phase_change', {'phase': 'night', 'message': 'Night phase begins!'})
-    asyncio.create_task(end_night_after_delay(10))
+    await publish(room, 'phase_change', {'phase': 'night', 'message': 'Night phase begins!'})
+    arm_timer(room.room_id, state)
 
 @sio.event
+@routed
+@limited
 async def night_action(sid, data):
     """Handle night actions from players"""
     action_type = data.get('action')
     target_sid = data.get('target')
+    room = await get_room(sid)
+    if room is None:
+        return
 
-    game_state_manager.record_night_action(action_type, sid, target_sid)
+    # Keyed by slot, as the state is: another actor can overwrite it in between
+    key = ('night_action', NIGHT_ACTION_FIELDS.get(action_type, action_type))
+    if room.applied_actions.get(key) == (sid, target_sid):
+        await sio.emit('action_received', {'action': action_type}, to=sid)
+        return
+    if not await room.state_manager.record_night_action(action_type, sid, target_sid):
+        await sio.emit('error', {'message': 'Action not allowed'}, to=sid)
+        return
+    room.applied_actions[key] = (sid, target_sid)
     await sio.emit('action_received', {'action': action_type}, to=sid)
 
-async def end_night_after_delay(delay: int):
-    await asyncio.sleep(delay)
-    logging.info("Auto-ending night phase...")
-    await sio.emit('end_night', {})
+    state = await room.state_manager.get_game_state()
+    history.action(state, action_type, sid, target_sid)
 
-@sio.event
-async def end_night(sid, data):
+    # No need to wait out the timer once everyone who can act has acted
+    if night_actions_complete(state):
+        await end_night_phase(room.room_id)
+
+async def end_night_phase(room_id: str):
     """Process night actions and move to day"""
-    state = game_state_manager.get_game_state()
-    process_night_actions(state)
-    check_win_conditions(state)
-    game_state_manager.save_game_state(state)
+    room = rooms.get(room_id)
+    if room is None:
+        return
+
+    deadline = None
+
+    def resolve_night(state):
+        nonlocal deadline
+        # The timer and an early finish can race; only the first one resolves it
+        if state['phase'] != GamePhase.NIGHT.value:
+            return False
+        deadline = state.get('deadline')
+        run_night(state)
+        check_win_conditions(state)
+        if not state.get('winner'):
+            start_day_phase(state)
+        set_deadline(state)
+        return True
+
+    state = await room.state_manager.update_game_state(resolve_night)
+    if state is None:
+        return
+    observe_phase(GamePhase.NIGHT.value, deadline)
+    scheduler.cancel(room_id)
+    room.applied_actions.clear()
+    await send_private_views(room, state)
+    for dead in state['deaths']:
+        history.action(state, 'death', dead, phase=GamePhase.NIGHT.value)
 
     # Notify about deaths
     if state['deaths']:
-        await sio.emit('night_results', {
+        await publish(room, 'player_died', {'sids': state['deaths']})
+        await publish(room, 'night_results', {
             'deaths': state['deaths'],
             'message': f"Players died: {[p.name for p in state['players'] if p.sid in state['deaths']]}"
         })
 
     if state.get('winner'):
-        await sio.emit('game_over', {'winner': state['winner']})
+        await finish_game(room, state)
     else:
-        game_state_manager.update_phase(GamePhase.DAY)
-        await sio.emit('phase_change', {'phase': 'day', 'message': 'Day phase begins! Time to vote.'})
+        await publish(room, 'phase_change', {'phase': 'day', 'message': 'Day phase begins! Time to vote.'})
+        arm_timer(room_id, state)
 
 @sio.event
+@routed
+@limited
 async def vote(sid, data):
     """Handle voting during day phase"""
     target_sid = data.get('target')
-    # TODO: Collect all votes and process after timeout or all voted
+    room = await get_room(sid)
+    if room is None:
+        return
+
+    key = ('vote', sid)
+    if room.applied_actions.get(key) == (sid, target_sid):
+        await sio.emit('vote_received', {'message': 'Vote recorded'}, to=sid)
+        return
+    if not await room.state_manager.record_vote(sid, target_sid):
+        await sio.emit('error', {'message': 'Vote not allowed'}, to=sid)
+        return
+    room.applied_actions[key] = (sid, target_sid)
     await sio.emit('vote_received', {'message': 'Vote recorded'}, to=sid)
 
-@sio.event
-async def end_day(sid, data):
+    state = await room.state_manager.get_game_state()
+    history.action(state, 'vote', sid, target_sid)
+
+    # Resolve the day as soon as everyone has voted rather than waiting for the timer
+    if votes_complete(state):
+        await end_day_phase(room.room_id)
+
+async def end_day_phase(room_id: str):
     """Process votes and move to night"""
-    # TODO: Process votes
-    state = game_state_manager.get_game_state()
-    # For now, simulate processing
-    check_win_conditions(state)
-    game_state_manager.save_game_state(state)
+    room = rooms.get(room_id)
+    if room is None:
+        return
+
+    deadline = None
+
+    def resolve_day(state):
+        nonlocal deadline
+        if state['phase'] != GamePhase.DAY.value:
+            return False
+        deadline = state.get('deadline')
+        run_day(state)
+        if not state.get('winner'):
+            check_win_conditions(state)
+        if not state.get('winner'):
+            start_night_phase(state)
+        set_deadline(state)
+        return True
+
+    state = await room.state_manager.update_game_state(resolve_day)
+    if state is None:
+        return
+    observe_phase(GamePhase.DAY.value, deadline)
+    scheduler.cancel(room_id)
+    room.applied_actions.clear()
+
+    eliminated = get_player(state, state.get('eliminated'))
+    if eliminated:
+        history.action(state, 'eliminated', eliminated.sid, phase=GamePhase.DAY.value)
+        await publish(room, 'player_died', {'sids': [eliminated.sid]})
+    await publish(room, 'day_results', {
+        'eliminated': eliminated.sid if eliminated else None,
+        'message': f"{eliminated.name} was voted out" if eliminated else 'The vote was tied; nobody was eliminated'
+    })
 
     if state.get('winner'):
-        await sio.emit('game_over', {'winner': state['winner']})
+        await finish_game(room, state)
     else:
-        start_night_phase(state)
-        game_state_manager.save_game_state(state)
-        await sio.emit('phase_change', {'phase': 'night', 'message': 'Night phase begins!'})
+        await publish(room, 'phase_change', {'phase': 'night', 'message': 'Night phase begins!'})
+        arm_timer(room_id, state)
 
 # HTTP routes
 @app.get("/")
 async def root():
-    state = game_state_manager.get_game_state()
     return {
         "message": "Mafia Game Server is running",
         "status": "online",
+        "wire_format": WIRE_FORMAT,
+        "rooms": len(rooms.rooms),
+        "players": rooms.player_count()
+    }
+
+@app.get("/rooms/{room_id}")
+async def room_status(room_id: str):
+    room = rooms.get(room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    state = await room.state_manager.get_game_state()
+    return {
+        "room_id": room_id,
         "players": len(state['players']),
         "phase": state['phase']
     }
 
+async def recover_games():
+    """Adopt games whose node restarted or died, and re-arm their timers"""
+    started = time.perf_counter()
+    adopted = 0
+    # Rooms live nodes hold are skipped with one round trip, so only orphans are claimed
+    for entry in await recover_rooms(skip=rooms.rooms, unowned=cluster.unowned):
+        room_id = entry['room_id']
+        if await cluster.claim(room_id) != cluster.node_id:
+            # Another node adopted it first
+            continue
+        if entry['phase'] not in PHASE_SECONDS:
+            # Lobbies and finished games have nobody coming back to them
+            await entry['manager'].reset_game()
+            await cluster.release(room_id)
+            continue
+        rooms.restore(room_id, entry['manager'], entry['rules'])
+        arm_timer(room_id, entry)
+        adopted += 1
+    if adopted:
+        logging.info(f"Recovered {adopted} games in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+async def recovery_loop():
+    # Leases of a dead node lapse after LEASE_SECONDS; sweep again for its games
+    while True:
+        try:
+            await recover_games()
+        except Exception:
+            logging.exception("Game recovery sweep failed")
+        await asyncio.sleep(LEASE_SECONDS)
+
+recovery_task: Optional[asyncio.Task] = None
+
+async def resume_games():
+    global recovery_task
+    if redis_client is not None:
+        recovery_task = asyncio.create_task(recovery_loop())
+    else:
+        await recover_games()
+
+# Match history and stats; plain def so the blocking queries run in the threadpool
+@app.get("/history")
+def history_list(player: Optional[str] = None, before: Optional[int] = None,
+                 limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)):
+    """Newest games first; pass the last game's cursor as before= for the next page"""
+    return match_history(db, player, limit, before)
+
+@app.get("/history/{session_id}")
+def history_detail(session_id: str, db: Session = Depends(get_db)):
+    game = game_detail(db, session_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return game
+
+@app.get("/stats/roles")
+def stats_roles(db: Session = Depends(get_db)):
+    return role_win_rates(db)
+
+@app.get("/stats/players/{name}")
+def stats_player(name: str, db: Session = Depends(get_db)):
+    stats = player_stats(db, name)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return stats
+
+@app.get("/leaderboard")
+def stats_leaderboard(limit: int = Query(20, ge=1, le=100), min_games: int = Query(5, ge=1),
+                      db: Session = Depends(get_db)):
+    return leaderboard(db, limit, min_games)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """This node's metrics in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    """Liveness plus a ping of the state backend, for load balancers and autoscalers"""
+    backend = 'redis' if redis_client is not None else 'memory'
+    if not await backend_healthy():
+        return JSONResponse({"status": "unhealthy", "backend": backend}, status_code=503)
+    return {"status": "healthy", "backend": backend}
 
 @app.post("/reset")
-async def reset_game():
-    """Reset game state for testing"""
-    game_state_manager.reset_game()
+async def reset_game(room_id: Optional[str] = None):
+    """Reset one room, or every room, for testing"""
+    if room_id:
+        await discard_room(room_id)
+    else:
+        for room_id in list(rooms.rooms):
+            await cluster.release(room_id)
+        await rooms.clear()
+        await scheduler.stop()
+        await grace_timers.stop()
+        seats.clear()
+        seat_sockets.clear()
+        for feed in spectator_feeds.values():
+            feed.stop()
+        spectator_feeds.clear()
+        watching.clear()
+        views.clear()
     return {"message": "Game reset"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:socket_app", host="0.0.0.0", port=8000, reload=True)
+    # Workers only share games through Redis; without it stay on one process
+    workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)) if redis_reachable() else 1
+    uvicorn.run("main:socket_app", host="0.0.0.0", port=8000, reload=workers == 1, workers=workers)
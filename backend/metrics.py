@@ -0,0 +1,150 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Small enough to live on the hot path: recording is a dict lookup and an
+addition, and nothing is formatted until /metrics is scraped.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; fine-grained at the low end where handlers and Redis calls live
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PHASE_BUCKETS = (1, 2.5, 5, 10, 15, 30, 45, 60, 90, 120)
+FANOUT_BUCKETS = (1, 2, 5, 7, 10, 20, 50, 100, 250)
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+        if not self.labels:
+            # Unlabelled series report 0 before their first increment
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.callback is not None:
+            return [f"{self.name} {_format_value(self.callback())}"]
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+def gauge(name: str, help: str, labels: Sequence[str] = (), callback: Optional[Callable[[], float]] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels, callback))
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+# State layer
+STATE_OP_SECONDS = histogram('mafia_state_op_seconds', "Time spent in state backend operations", ('op',))
+STATE_CONFLICTS = counter('mafia_state_conflicts_total', "Optimistic transactions retried after a conflicting write")
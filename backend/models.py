@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from datetime import datetime
+import threading
 
 Base = declarative_base()
 
@@ -12,19 +13,22 @@ class GameSession(Base):
     session_id = Column(String(50), unique=True, nullable=False)
     start_time = Column(DateTime, default=datetime.utcnow)
     end_time = Column(DateTime, nullable=True)
-    winner = Column(String(20), nullable=True)  # 'good', 'evil', 'joker'
+    winner = Column(String(20), nullable=True, index=True)  # 'good', 'evil', 'joker'
     player_count = Column(Integer, default=7)
 
 class PlayerRecord(Base):
     __tablename__ = 'player_records'
 
     id = Column(Integer, primary_key=True)
-    game_session_id = Column(Integer, nullable=False)
+    game_session_id = Column(Integer, nullable=False, index=True)
     player_name = Column(String(100), nullable=False)
-    role = Column(String(20), nullable=False)
+    role = Column(String(20), nullable=False, index=True)
     is_alive = Column(Boolean, default=True)
     joined_at = Column(DateTime, default=datetime.utcnow)
 
+    # A player's match history, newest first, straight off the index
+    __table_args__ = (Index('ix_player_records_player_game', 'player_name', 'game_session_id'),)
+
 class GameAction(Base):
     __tablename__ = 'game_actions'
 
@@ -37,28 +41,64 @@ class GameAction(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     details = Column(Text, nullable=True)
 
+    __table_args__ = (Index('ix_game_actions_game_time', 'game_session_id', 'timestamp'),)
+
+# Aggregates below are bumped by the history writer in the same transaction
+# that closes a game, so stats endpoints never scan the records above
+
+class PlayerStats(Base):
+    __tablename__ = 'player_stats'
+
+    player_name = Column(String(100), primary_key=True)
+    games = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0, index=True)
+    survived = Column(Integer, nullable=False, default=0)
+    last_played = Column(DateTime, nullable=True)
+
+class RoleStats(Base):
+    __tablename__ = 'role_stats'
+
+    role = Column(String(20), primary_key=True)
+    games = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+
 # Database setup
 DATABASE_URL = "sqlite:///./mafia_game.db"  # For development, use SQLite
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Created on first use, so importing the models never touches the database
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+        return _engine
+
+def open_session() -> Session:
+    return SessionLocal(bind=get_engine())
 
 def create_tables():
-    """Create all database tables"""
+    """Create all database tables, and any indexes added since they were created"""
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 def get_db():
-    """Get database session"""
-    db = SessionLocal()
+    """Yield a database session and close it afterwards (FastAPI dependency)"""
+    db = open_session()
     try:
-        return db
+        yield db
     finally:
         db.close()
 
 # Usage example:
 # from models import create_tables, GameSession, PlayerRecord, GameAction, get_db
 # create_tables()
-# db = get_db()
-# new_session = GameSession(session_id="game_123")
-# db.add(new_session)
-# db.commit()
+# @app.get("/games")
+# def list_games(db: Session = Depends(get_db)):
+#     return db.query(GameSession).all()
@@ -0,0 +1,159 @@
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from game import RULE_SETS, DEFAULT_RULES
+
+# Table events kept per room for clients that resume after a short drop
+REPLAY_EVENTS = 256
+
+
+class Room:
+    def __init__(self, room_id: str, state_manager, rules: str = DEFAULT_RULES):
+        self.room_id = room_id
+        self.state_manager = state_manager
+        self.rules = rules
+        self.capacity = RULE_SETS[rules].max_players
+        self.members: Set[str] = set()
+        self.started = False
+        # Sequence number of the last event broadcast to this room. It only lives in
+        # this process and restarts at 0 when the game is recovered elsewhere, so
+        # clients hold it together with the epoch it was counted in.
+        self.seq = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        # The latest broadcasts as (seq, event, payload), oldest first
+        self.recent: Deque[Tuple[int, str, Dict]] = deque(maxlen=REPLAY_EVENTS)
+        # Latest (sid, target) applied this phase per night action slot or voter,
+        # so a repeat of the current choice skips the state round trip
+        self.applied_actions: Dict[tuple, tuple] = {}
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.members) >= self.capacity
+
+    @property
+    def is_open(self) -> bool:
+        """Room is still in the lobby and has a free seat"""
+        return not self.started and not self.is_full
+
+    def missed_since(self, epoch: Optional[str], seq: int) -> Optional[List[Tuple[int, str, Dict]]]:
+        """Broadcasts after seq of the given epoch, or None if some of them are no longer kept"""
+        if epoch != self.epoch or seq > self.seq or seq < 0:
+            return None
+        if seq < self.seq and (not self.recent or self.recent[0][0] > seq + 1):
+            return None
+        return [entry for entry in self.recent if entry[0] > seq]
+
+
+class RoomRegistry:
+    """Tracks every table hosted by this process and which socket sits where.
+
+    Each room owns its own state manager, so games never share state, and
+    open rooms are kept in insertion order per rule set so the matchmaker
+    fills the oldest lobby first in O(1).
+    """
+
+    def __init__(self, manager_factory: Callable[[str, str], object]):
+        self.manager_factory = manager_factory
+        self.rooms: Dict[str, Room] = {}
+        self._sid_rooms: Dict[str, str] = {}
+        self._open_rooms: Dict[str, Dict[str, None]] = {name: {} for name in RULE_SETS}
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def get_or_create(self, room_id: Optional[str] = None, rules: str = DEFAULT_RULES) -> Room:
+        """Get a room by id, creating it with the given rules if it does not exist yet"""
+        room_id = room_id or uuid.uuid4().hex[:8]
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = Room(room_id, self.manager_factory(room_id, rules), rules)
+            self.rooms[room_id] = room
+            self._open_rooms[rules][room_id] = None
+        return room
+
+    def restore(self, room_id: str, state_manager, rules: str = DEFAULT_RULES) -> Room:
+        """Re-host a game already in progress, e.g. one recovered after a restart"""
+        room = Room(room_id, state_manager, rules)
+        room.started = True
+        self.rooms[room_id] = room
+        return room
+
+    def find_open_room(self, rules: str = DEFAULT_RULES) -> Room:
+        """Matchmaker: oldest lobby with a free seat, or a fresh room"""
+        for room_id in self._open_rooms[rules]:
+            return self.rooms[room_id]
+        return self.get_or_create(rules=rules)
+
+    def room_for_sid(self, sid: str) -> Optional[Room]:
+        room_id = self._sid_rooms.get(sid)
+        return self.rooms.get(room_id) if room_id else None
+
+    def join(self, sid: str, room_id: Optional[str] = None, rules: str = DEFAULT_RULES) -> Optional[Room]:
+        """Seat a socket in the requested room, or matchmake one.
+
+        Returns None if the requested room is full or already playing.
+        Joining an existing room keeps that room's rules.
+        """
+        current = self.room_for_sid(sid)
+        if current is not None:
+            return current
+
+        room = self.get_or_create(room_id, rules) if room_id else self.find_open_room(rules)
+        if not room.is_open:
+            return None
+
+        room.members.add(sid)
+        self._sid_rooms[sid] = room.room_id
+        self._refresh(room)
+        return room
+
+    def seat(self, sid: str, room_id: str) -> Optional[Room]:
+        """Put a resuming player back in their room, e.g. a game recovered without its members"""
+        room = self.rooms.get(room_id)
+        if room is not None:
+            room.members.add(sid)
+            self._sid_rooms[sid] = room_id
+            self._refresh(room)
+        return room
+
+    async def leave(self, sid: str) -> Optional[Room]:
+        """Remove a socket from its room; empty rooms are discarded"""
+        room_id = self._sid_rooms.pop(sid, None)
+        room = self.rooms.get(room_id) if room_id else None
+        if room is None:
+            return None
+
+        room.members.discard(sid)
+        if not room.members:
+            await self.discard(room.room_id)
+        else:
+            self._refresh(room)
+        return room
+
+    def mark_started(self, room_id: str) -> None:
+        room = self.rooms.get(room_id)
+        if room is not None:
+            room.started = True
+            self._refresh(room)
+
+    async def discard(self, room_id: str) -> None:
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return
+        self._open_rooms[room.rules].pop(room_id, None)
+        for sid in room.members:
+            self._sid_rooms.pop(sid, None)
+        await room.state_manager.reset_game()
+
+    async def clear(self) -> None:
+        for room_id in list(self.rooms):
+            await self.discard(room_id)
+
+    def player_count(self) -> int:
+        return len(self._sid_rooms)
+
+    def _refresh(self, room: Room) -> None:
+        if room.is_open:
+            self._open_rooms[room.rules].setdefault(room.room_id, None)
+        else:
+            self._open_rooms[room.rules].pop(room.room_id, None)
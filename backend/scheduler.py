@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+PhaseCallback = Callable[[str], Awaitable[None]]
+
+
+class PhaseScheduler:
+    """Drives every room's phase deadline from a single loop.
+
+    Deadlines live in one heap instead of one sleeping task per game.
+    Rescheduling or cancelling a room just bumps its token; superseded
+    heap entries are skipped when they surface.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap: List[Tuple[float, int, str, PhaseCallback]] = []
+        self._tokens: Dict[str, Tuple[int, float]] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def schedule(self, room_id: str, delay: float, callback: PhaseCallback) -> float:
+        """Run callback(room_id) after delay seconds, replacing any pending deadline"""
+        deadline = self.clock() + delay
+        seq = next(self._seq)
+        self._tokens[room_id] = (seq, deadline)
+        heapq.heappush(self._heap, (deadline, seq, room_id, callback))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+        self._ensure_running()
+        return deadline
+
+    def cancel(self, room_id: str) -> bool:
+        """Drop a room's pending deadline; returns whether one was pending"""
+        cancelled = self._tokens.pop(room_id, None) is not None
+        # Superseded entries are dropped lazily, but don't let them pile up
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._tokens):
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+        return cancelled
+
+    def deadline(self, room_id: str) -> Optional[float]:
+        token = self._tokens.get(room_id)
+        return token[1] if token else None
+
+    def pending(self) -> int:
+        return len(self._tokens)
+
+    def _is_current(self, entry) -> bool:
+        token = self._tokens.get(entry[2])
+        return token is not None and token[0] == entry[1]
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            now = self.clock()
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._is_current(entry):
+                    del self._tokens[entry[2]]
+                    self._fire(entry[2], entry[3])
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _fire(self, room_id: str, callback: PhaseCallback) -> None:
+        task = asyncio.get_running_loop().create_task(callback(room_id))
+        self._running.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error("Phase callback failed", exc_info=task.exception())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._tokens.clear()
+        self._heap.clear()
@@ -0,0 +1,67 @@
+"""Headless all-AI games on the game.py engine, no sockets or state backend."""
+import random
+import time
+from typing import Dict, List, Optional
+from game import (GamePhase, DEFAULT_RULES, initialize_game_state, start_game_with_ai, start_night_phase,
+                  start_day_phase, check_win_conditions)
+from ai import DEFAULT_POLICY, run_night, run_day
+
+# Safety net against endless tied days; real games end far sooner
+MAX_ROUNDS = 200
+
+PHASES = ('setup', 'night', 'day', 'win_check')
+
+def _timed(timings: Optional[Dict[str, List[int]]], phase: str, started: int) -> None:
+    if timings is not None:
+        timings[phase].append(time.perf_counter_ns() - started)
+
+def simulate_game(seed: int, rules: str = DEFAULT_RULES, table_size: Optional[int] = None,
+                  timings: Optional[Dict[str, List[int]]] = None, max_rounds: int = MAX_ROUNDS,
+                  policy: str = DEFAULT_POLICY) -> Dict:
+    """Play one seeded all-AI game to the end and return its outcome.
+
+    If timings is given (phase -> list), the nanoseconds spent in each
+    engine call are appended to it.
+    """
+    rng = random.Random(seed)
+
+    started = time.perf_counter_ns()
+    state = initialize_game_state(rules)
+    state['ai_policy'] = policy
+    start_game_with_ai(state, table_size, rng)
+    _timed(timings, 'setup', started)
+
+    rounds = 0
+    while rounds < max_rounds:
+        rounds += 1
+
+        started = time.perf_counter_ns()
+        start_night_phase(state)
+        run_night(state, rng)
+        _timed(timings, 'night', started)
+
+        started = time.perf_counter_ns()
+        check_win_conditions(state)
+        _timed(timings, 'win_check', started)
+        if state['phase'] == GamePhase.GAME_OVER.value:
+            break
+
+        started = time.perf_counter_ns()
+        start_day_phase(state)
+        run_day(state, rng)
+        _timed(timings, 'day', started)
+        if state['phase'] == GamePhase.GAME_OVER.value:
+            break
+
+        started = time.perf_counter_ns()
+        check_win_conditions(state)
+        _timed(timings, 'win_check', started)
+        if state['phase'] == GamePhase.GAME_OVER.value:
+            break
+
+    return {
+        'seed': seed,
+        'winner': state.get('winner'),
+        'rounds': rounds,
+        'players': [(p.role.value, p.alive) for p in state['players']]
+    }
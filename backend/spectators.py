@@ -0,0 +1,74 @@
+"""Public event feeds for people watching a table.
+
+Spectators of a table share one Socket.IO room, so each public event is
+emitted, and encoded, once for the whole audience however large it is.
+A feed relays the table's sequenced events to that room from its own task,
+optionally some seconds late so watchers can't pass live information back
+to the players, and a slow or crowded audience never holds up a broadcast
+to the table itself.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+Emit = Callable[[str, Dict, str], Awaitable]
+EnterRoom = Callable[[str, str], Awaitable]
+
+def spectator_room(room_id: str) -> str:
+    """Socket.IO room for everyone watching a table"""
+    return f"{room_id}:spectators"
+
+
+class SpectatorFeed:
+    """One table's public events, relayed to its spectators delay seconds after they happen"""
+
+    def __init__(self, room_id: str, delay: float, emit: Emit, enter_room: EnterRoom):
+        self.room = spectator_room(room_id)
+        self.delay = delay
+        self.emit = emit
+        self.enter_room = enter_room
+        # (due, sid to admit or None, event, payload), oldest first
+        self._queue: Deque[Tuple[float, Optional[str], str, Dict]] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, event: str, payload: Dict) -> None:
+        """Queue a table event for the spectators"""
+        self._enqueue(None, event, payload)
+
+    def admit(self, sid: str, snapshot: Dict) -> None:
+        """Add a spectator once the feed reaches this moment, starting them from the snapshot taken now"""
+        self._enqueue(sid, 'roster_snapshot', snapshot)
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self._queue.clear()
+
+    def _enqueue(self, sid: Optional[str], event: str, payload: Dict) -> None:
+        self._queue.append((time.monotonic() + self.delay, sid, event, payload))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Ends once the queue is empty; the next push starts a new run
+        while self._queue:
+            due, sid, event, payload = self._queue[0]
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            self._queue.popleft()
+            try:
+                if sid is None:
+                    await self.emit(event, payload, self.room)
+                else:
+                    await self.enter_room(sid, self.room)
+                    await self.emit(event, payload, sid)
+            except Exception:
+                # Most likely a spectator who left before their snapshot was due
+                logging.exception(f"Spectator feed {self.room} failed to send {event}")
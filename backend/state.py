@@ -1,116 +1,410 @@
 import redis
+import redis.asyncio as aioredis
+import asyncio
 import json
-from typing import Dict, List, Optional
-from game import Player, GamePhase, initialize_game_state
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+from game import (Player, GamePhase, DERIVED_KEYS, DEFAULT_RULES, NIGHT_ACTION_ROLES, initialize_game_state,
+                  index_players, get_player, get_rule_set, add_player, remove_player, cast_vote)
+from eventlog import EventLog
+from metrics import STATE_OP_SECONDS, STATE_CONFLICTS
+from wire import STATE_CODEC, encode_ops
 
-class GameStateManager:
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
-        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
-        self.game_key = "mafia_game_state"
+# An empty MAFIA_REDIS_URL forces in-memory state even if a local Redis is up
+REDIS_URL = os.environ.get('MAFIA_REDIS_URL', "redis://localhost:6379")
 
-    def get_game_state(self) -> Dict:
-        """Get current game state from Redis"""
-        state_json = self.redis.get(self.game_key)
-        if state_json:
-            state = json.loads(state_json)
-            # Reconstruct Player objects
-            state['players'] = [Player(**p) for p in state['players']]
-            return state
-        return initialize_game_state()
+# Set of every room with state in Redis, so a restarted node can find them
+ROOMS_KEY = "mafia:rooms"
+# Approximate length each room's change stream is trimmed to; the room
+# hashes always hold the full current state
+LOG_MAXLEN = 1000
+# Where the in-memory backend logs changes so games survive a restart
+EVENT_LOG_PATH = os.environ.get('MAFIA_EVENT_LOG', 'mafia-events.log')
 
-    def save_game_state(self, state: Dict) -> None:
-        """Save game state to Redis"""
-        # Convert Player objects to dicts
-        state_copy = state.copy()
-        state_copy['players'] = [p.to_dict() for p in state['players']]
-        self.redis.set(self.game_key, json.dumps(state_copy))
+# Night action event name -> slot in state['night_actions']
+NIGHT_ACTION_FIELDS = {
+    'witch_inspect': 'witch_inspection',
+    'detective_inspect': 'detective_inspection',
+    'duant_link': 'duant_target',
+    'kill': 'kill_target'
+}
+
+# How many times a conflicting transaction is re-applied before giving up
+MAX_TRANSACTION_RETRIES = 16
+
+def apply_add_player(state: Dict, sid: str, name: str, resume_token: Optional[str] = None) -> bool:
+    """Seat a new player if there is room; returns whether the state changed"""
+    if len(state['players']) >= get_rule_set(state).max_players or get_player(state, sid):
+        return False
+    add_player(state, Player(sid, name))
+    if resume_token:
+        # Stored with the game so seats can be resumed after a restart too
+        state.setdefault('resume_tokens', {})[resume_token] = sid
+    return True
+
+def apply_night_action(state: Dict, action_type: str, player_sid: str, target_sid: Optional[str]) -> bool:
+    """Record a night action target; returns whether the state changed"""
+    field = NIGHT_ACTION_FIELDS.get(action_type)
+    if field is None or state['phase'] != GamePhase.NIGHT.value:
+        return False
+    # Only a living holder of the matching role may fill the slot
+    actor = get_player(state, player_sid)
+    if actor is None or not actor.alive or NIGHT_ACTION_ROLES.get(actor.role) != field:
+        return False
+    # ...and only at a seated player who is still alive
+    target = get_player(state, target_sid)
+    if target is None or not target.alive:
+        return False
+    state.setdefault('night_actions', {})[field] = target_sid
+    return True
+
+def apply_remove_player(state: Dict, sid: str) -> bool:
+    tokens = state.get('resume_tokens') or {}
+    for token in [token for token, seat in tokens.items() if seat == sid]:
+        del tokens[token]
+    return remove_player(state, sid) is not None
+
+def apply_vote(state: Dict, voter_sid: str, target_sid: Optional[str]) -> bool:
+    return cast_vote(state, voter_sid, target_sid)
+
+def apply_phase(state: Dict, phase: GamePhase) -> bool:
+    state['phase'] = phase.value
+    return True
+
+def apply_clear_night_actions(state: Dict) -> bool:
+    state['night_actions'] = {}
+    return True
+
+class StaleStateError(Exception):
+    """Raised when another writer saved a newer version of the game"""
+
+# Compare-and-set: apply a batch of field-level writes only if Redis still
+# holds the version we loaded, and append them to the room's change stream.
+# The ops arrive as JSON or MessagePack, named by ARGV[4] (see wire.py).
+# Returns the new version, or -1 if it moved on.
+APPLY_IF_CURRENT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if current ~= tonumber(ARGV[1]) then
+    return -1
+end
+local ops
+if ARGV[4] == 'msgpack' then
+    ops = cmsgpack.unpack(ARGV[2])
+else
+    ops = cjson.decode(ARGV[2])
+end
+for _, op in ipairs(ops) do
+    redis.call(unpack(op))
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'v', version, 'ops', ARGV[2], 'codec', ARGV[4])
+return version
+"""
+
+# Delete every key of a room, including one hash per seated player
+DELETE_ROOM = """
+for _, sid in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    redis.call('DEL', ARGV[1] .. sid)
+end
+redis.call('DEL', unpack(KEYS))
+return 1
+"""
+
+class RoomKeys:
+    """Redis layout of one room.
+
+    The room id is wrapped in a hash tag so every key of a room maps to the
+    same cluster slot and can be touched by one script.
+    """
+
+    def __init__(self, room_id: str):
+        prefix = f"mafia:{{{room_id}}}"
+        self.meta = f"{prefix}:meta"                    # hash: phase, winner, ..., version
+        self.order = f"{prefix}:players"                # list: sids in seating order
+        self.alive = f"{prefix}:alive"                  # set: sids still alive
+        self.night_actions = f"{prefix}:night_actions"  # hash: slot -> target sid
+        self.votes = f"{prefix}:votes"                  # hash: voter sid -> target sid
+        self.player_prefix = f"{prefix}:player:"        # hash per player
+        self.log = f"{prefix}:log"                      # stream: one entry per saved change
+
+    def player(self, sid: str) -> str:
+        return self.player_prefix + sid
+
+    def all(self) -> List[str]:
+        return [self.order, self.meta, self.night_actions, self.votes, self.alive, self.log]
+
+def snapshot_state(state: Dict) -> Dict:
+    """Flatten a game state into the field values stored in Redis"""
+    meta = {key: json.dumps(value) for key, value in state.items()
+            if key not in ('players', 'night_actions', 'votes', 'version') + DERIVED_KEYS}
+    return {
+        'meta': meta,
+        'order': [p.sid for p in state['players']],
+        'players': {p.sid: {k: json.dumps(v) for k, v in p.to_dict().items()} for p in state['players']},
+        'alive': {p.sid for p in state['players'] if p.alive},
+        'night_actions': {k: json.dumps(v) for k, v in (state.get('night_actions') or {}).items()},
+        'votes': {k: json.dumps(v) for k, v in (state.get('votes') or {}).items()}
+    }
+
+def empty_snapshot() -> Dict:
+    return {'meta': {}, 'order': [], 'players': {}, 'alive': set(), 'night_actions': {}, 'votes': {}}
+
+def _diff_hash(key: str, old: Dict[str, str], new: Dict[str, str]) -> List[List[str]]:
+    ops = []
+    changed = [item for field, value in new.items() if old.get(field) != value for item in (field, value)]
+    if changed:
+        ops.append(['HSET', key] + changed)
+    removed = [field for field in old if field not in new]
+    if removed:
+        ops.append(['HDEL', key] + removed)
+    return ops
+
+def diff_snapshots(keys: RoomKeys, old: Dict, new: Dict) -> List[List[str]]:
+    """Redis commands that turn the stored snapshot old into new.
+
+    Only changed fields are written, so recording one action costs the same
+    regardless of how many players are seated.
+    """
+    ops = _diff_hash(keys.meta, old['meta'], new['meta'])
+    ops += _diff_hash(keys.night_actions, old['night_actions'], new['night_actions'])
+    ops += _diff_hash(keys.votes, old['votes'], new['votes'])
+
+    old_sids, new_sids = set(old['order']), set(new['order'])
+    for sid in old_sids - new_sids:
+        ops.append(['DEL', keys.player(sid)])
+    for sid in new['order']:
+        ops += _diff_hash(keys.player(sid), old['players'].get(sid, {}), new['players'][sid])
 
-    def add_player(self, sid: str, name: str) -> None:
+    # Seating normally only changes by removals and appends
+    kept = [sid for sid in old['order'] if sid in new_sids]
+    appended = [sid for sid in new['order'] if sid not in old_sids]
+    if kept + appended == new['order']:
+        ops += [['LREM', keys.order, '0', sid] for sid in old_sids - new_sids]
+        if appended:
+            ops.append(['RPUSH', keys.order] + appended)
+    else:
+        ops.append(['DEL', keys.order])
+        ops.append(['RPUSH', keys.order] + new['order'])
+
+    if new['alive'] - old['alive']:
+        ops.append(['SADD', keys.alive] + sorted(new['alive'] - old['alive']))
+    if old['alive'] - new['alive']:
+        ops.append(['SREM', keys.alive] + sorted(old['alive'] - new['alive']))
+    return ops
+
+def decode_player(fields: Dict[str, str]) -> Player:
+    return Player.from_dict({k: json.loads(v) for k, v in fields.items()})
+
+def build_state(meta: Dict[str, str], night_actions: Dict[str, str], votes: Dict[str, str],
+                players: List[Dict[str, str]], rules: str = DEFAULT_RULES) -> Dict:
+    """Rebuild a game state from its stored hashes"""
+    state = initialize_game_state(rules)
+    version = int(meta.pop('version', 0))
+    state.update({k: json.loads(v) for k, v in meta.items()})
+    state['night_actions'] = {k: json.loads(v) for k, v in night_actions.items()}
+    state['votes'] = {k: json.loads(v) for k, v in votes.items()}
+    state['players'] = [decode_player(fields) for fields in players if fields]
+    state['version'] = version
+    return index_players(state)
+
+class AsyncGameStateManager:
+    """Game state for one room, cached in process and written through to Redis.
+
+    Built on redis.asyncio so a slow Redis round trip for one table
+    suspends only that handler instead of blocking the event loop.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, room_id: str = "default",
+                 client: Optional[aioredis.Redis] = None, rules: str = DEFAULT_RULES):
+        self.room_id = room_id
+        self.rules = rules
+        self.keys = RoomKeys(room_id)
+        # Authoritative copy of the game, plus what Redis currently holds
+        self._state: Optional[Dict] = None
+        self._saved = empty_snapshot()
+        self.redis = client or aioredis.Redis.from_url(redis_url, decode_responses=True)
+        self._apply_if_current = self.redis.register_script(APPLY_IF_CURRENT)
+        self._delete_room = self.redis.register_script(DELETE_ROOM)
+
+    def _loaded(self, state: Dict, stored: bool = True) -> Dict:
+        self._state = state
+        # A room that was never saved has nothing in Redis to diff against
+        self._saved = snapshot_state(state) if stored else empty_snapshot()
+        return state
+
+    def _prepare_save(self, state: Dict):
+        snapshot = snapshot_state(state)
+        ops = diff_snapshots(self.keys, self._saved, snapshot)
+        return snapshot, [state.get('version', 0), encode_ops(ops), LOG_MAXLEN, STATE_CODEC]
+
+    def _finish_save(self, state: Dict, snapshot: Dict, version: int) -> None:
+        if version < 0:
+            self._state = None
+            raise StaleStateError(f"Game state for room {self.room_id} changed since version {state.get('version', 0)}")
+        state['version'] = version
+        self._state = state
+        self._saved = snapshot
+
+    async def get_game_state(self) -> Dict:
+        """Get current game state, loading it from Redis on first use"""
+        if self._state is None:
+            self._state = await self._load()
+        return self._state
+
+    async def _load(self) -> Dict:
+        with STATE_OP_SECONDS.time(op='load'):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.lrange(self.keys.order, 0, -1)
+                pipe.hgetall(self.keys.meta)
+                pipe.hgetall(self.keys.night_actions)
+                pipe.hgetall(self.keys.votes)
+                order, meta, night_actions, votes = await pipe.execute()
+            players = []
+            if order:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for sid in order:
+                        pipe.hgetall(self.keys.player(sid))
+                    players = await pipe.execute()
+        return self._loaded(build_state(meta, night_actions, votes, players, self.rules), stored=bool(meta))
+
+    async def is_stale(self) -> bool:
+        """Check whether Redis holds a newer version than the cached state"""
+        if self._state is None:
+            return False
+        return int(await self.redis.hget(self.keys.meta, 'version') or 0) != self._state['version']
+
+    async def refresh(self) -> Dict:
+        """Drop the cached state and reload it from Redis"""
+        self._state = await self._load()
+        return self._state
+
+    async def save_game_state(self, state: Dict) -> None:
+        """Write the changed fields through to Redis in a single round trip"""
+        first = not self._saved['meta']
+        snapshot, args = self._prepare_save(state)
+        with STATE_OP_SECONDS.time(op='save'):
+            version = await self._apply_if_current(keys=[self.keys.meta, self.keys.log], args=args)
+        self._finish_save(state, snapshot, version)
+        if first:
+            await self.redis.sadd(ROOMS_KEY, self.room_id)
+
+    async def update_game_state(self, mutator: Callable[[Dict], bool]) -> Optional[Dict]:
+        """Apply mutator to the state and save it atomically, retrying on conflicts"""
+        for _ in range(MAX_TRANSACTION_RETRIES):
+            state = await self.get_game_state()
+            if not mutator(state):
+                return None
+            try:
+                await self.save_game_state(state)
+                return state
+            except StaleStateError:
+                STATE_CONFLICTS.inc()
+                continue
+        raise StaleStateError(f"Gave up updating room {self.room_id} after {MAX_TRANSACTION_RETRIES} conflicts")
+
+    async def add_player(self, sid: str, name: str, resume_token: Optional[str] = None) -> bool:
         """Add a player to the game"""
-        state = self.get_game_state()
-        if len(state['players']) < 7:
-            player = Player(sid, name)
-            state['players'].append(player)
-            self.save_game_state(state)
+        action = lambda state: apply_add_player(state, sid, name, resume_token)
+        return await self.update_game_state(action) is not None
 
-    def remove_player(self, sid: str) -> None:
+    async def remove_player(self, sid: str) -> None:
         """Remove a player from the game"""
-        state = self.get_game_state()
-        state['players'] = [p for p in state['players'] if p.sid != sid]
-        self.save_game_state(state)
+        await self.update_game_state(lambda state: apply_remove_player(state, sid))
 
-    def get_player(self, sid: str) -> Optional[Player]:
+    async def get_player(self, sid: str) -> Optional[Player]:
         """Get a specific player by SID"""
-        state = self.get_game_state()
-        return next((p for p in state['players'] if p.sid == sid), None)
+        if self._state is None:
+            # Cold cache: read just this player's hash
+            fields = await self.redis.hgetall(self.keys.player(sid))
+            return decode_player(fields) if fields else None
+        return get_player(self._state, sid)
 
-    def get_alive_players(self) -> List[Player]:
+    async def get_alive_players(self) -> List[Player]:
         """Get list of alive players"""
-        state = self.get_game_state()
-        return [p for p in state['players'] if p.alive]
+        if self._state is None:
+            sids = await self.redis.smembers(self.keys.alive)
+            if not sids:
+                return []
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for sid in sids:
+                    pipe.hgetall(self.keys.player(sid))
+                return [decode_player(fields) for fields in await pipe.execute() if fields]
+        return [p for p in self._state['players'] if p.alive]
 
-    def get_players_dict(self) -> List[Dict]:
+    async def get_players_dict(self) -> List[Dict]:
         """Get players as dictionaries for API responses"""
-        state = self.get_game_state()
+        state = await self.get_game_state()
         return [p.to_dict() for p in state['players']]
 
-    def update_phase(self, phase: GamePhase) -> None:
+    async def update_phase(self, phase: GamePhase) -> None:
         """Update game phase"""
-        state = self.get_game_state()
-        state['phase'] = phase.value
-        self.save_game_state(state)
+        await self.update_game_state(lambda state: apply_phase(state, phase))
 
-    def record_night_action(self, action_type: str, player_sid: str, target_sid: Optional[str] = None) -> None:
+    async def record_night_action(self, action_type: str, player_sid: str, target_sid: Optional[str] = None) -> bool:
         """Record a night action"""
-        state = self.get_game_state()
-        if 'night_actions' not in state:
-            state['night_actions'] = {}
+        action = lambda state: apply_night_action(state, action_type, player_sid, target_sid)
+        return await self.update_game_state(action) is not None
 
-        if action_type == 'witch_inspect':
-            state['night_actions']['witch_inspection'] = target_sid
-        elif action_type == 'detective_inspect':
-            state['night_actions']['detective_inspection'] = target_sid
-        elif action_type == 'duant_link':
-            state['night_actions']['duant_target'] = target_sid
-        elif action_type == 'kill':
-            state['night_actions']['kill_target'] = target_sid
-
-        self.save_game_state(state)
-
-    def clear_night_actions(self) -> None:
+    async def clear_night_actions(self) -> None:
         """Clear night actions after processing"""
-        state = self.get_game_state()
-        state['night_actions'] = {}
-        self.save_game_state(state)
+        await self.update_game_state(apply_clear_night_actions)
 
-    def reset_game(self) -> None:
-        """Reset game state for a new game"""
-        self.redis.delete(self.game_key)
+    async def record_vote(self, voter_sid: str, target_sid: Optional[str]) -> bool:
+        """Record a day vote"""
+        return await self.update_game_state(lambda state: apply_vote(state, voter_sid, target_sid)) is not None
 
-# Global instance for easy access
-game_state_manager = GameStateManager()
+    async def reset_game(self) -> None:
+        """Reset game state for a new game"""
+        await self._delete_room(keys=self.keys.all(), args=[self.keys.player_prefix])
+        await self.redis.srem(ROOMS_KEY, self.room_id)
+        self._loaded(initialize_game_state(self.rules), stored=False)
 
 # Fallback in-memory storage if Redis is not available
 class InMemoryGameStateManager:
-    def __init__(self):
-        self._state = initialize_game_state()
+    def __init__(self, room_id: str = "default", rules: str = DEFAULT_RULES,
+                 log: Optional[EventLog] = None, state: Optional[Dict] = None):
+        self.room_id = room_id
+        self.rules = rules
+        self.log = log
+        self.keys = RoomKeys(room_id)
+        self._state = state or initialize_game_state(rules)
+        # What the log holds for this room, to diff the next change against
+        self._saved = snapshot_state(self._state) if state else empty_snapshot()
 
     def get_game_state(self) -> Dict:
         return self._state
 
     def save_game_state(self, state: Dict) -> None:
+        state['version'] = state.get('version', 0) + 1
         self._state = state
+        self._record()
+
+    def update_game_state(self, mutator: Callable[[Dict], bool]) -> Optional[Dict]:
+        # Mutators never await, so on one event loop they already run atomically
+        if not mutator(self._state):
+            return None
+        self._state['version'] += 1
+        self._record()
+        return self._state
+
+    def _record(self) -> None:
+        if self.log is None:
+            return
+        with STATE_OP_SECONDS.time(op='log'):
+            snapshot = snapshot_state(self._state)
+            self.log.append(self.room_id, self._state['version'], diff_snapshots(self.keys, self._saved, snapshot),
+                            snapshot)
+        self._saved = snapshot
 
-    def add_player(self, sid: str, name: str) -> None:
-        if len(self._state['players']) < 7:
-            player = Player(sid, name)
-            self._state['players'].append(player)
+    def add_player(self, sid: str, name: str, resume_token: Optional[str] = None) -> bool:
+        return self.update_game_state(lambda state: apply_add_player(state, sid, name, resume_token)) is not None
 
     def remove_player(self, sid: str) -> None:
-        self._state['players'] = [p for p in self._state['players'] if p.sid != sid]
+        self.update_game_state(lambda state: apply_remove_player(state, sid))
 
     def get_player(self, sid: str) -> Optional[Player]:
-        return next((p for p in self._state['players'] if p.sid == sid), None)
+        return get_player(self._state, sid)
 
     def get_alive_players(self) -> List[Player]:
         return [p for p in self._state['players'] if p.alive]
@@ -119,33 +413,195 @@ class InMemoryGameStateManager:
         return [p.to_dict() for p in self._state['players']]
 
     def update_phase(self, phase: GamePhase) -> None:
-        self._state['phase'] = phase.value
+        self.update_game_state(lambda state: apply_phase(state, phase))
 
-    def record_night_action(self, action_type: str, player_sid: str, target_sid: Optional[str] = None) -> None:
-        if 'night_actions' not in self._state:
-            self._state['night_actions'] = {}
-
-        if action_type == 'witch_inspect':
-            self._state['night_actions']['witch_inspection'] = target_sid
-        elif action_type == 'detective_inspect':
-            self._state['night_actions']['detective_inspection'] = target_sid
-        elif action_type == 'duant_link':
-            self._state['night_actions']['duant_target'] = target_sid
-        elif action_type == 'kill':
-            self._state['night_actions']['kill_target'] = target_sid
+    def record_night_action(self, action_type: str, player_sid: str, target_sid: Optional[str] = None) -> bool:
+        action = lambda state: apply_night_action(state, action_type, player_sid, target_sid)
+        return self.update_game_state(action) is not None
 
     def clear_night_actions(self) -> None:
-        self._state['night_actions'] = {}
+        self.update_game_state(apply_clear_night_actions)
+
+    def record_vote(self, voter_sid: str, target_sid: Optional[str]) -> bool:
+        return self.update_game_state(lambda state: apply_vote(state, voter_sid, target_sid)) is not None
+
+    def is_stale(self) -> bool:
+        return False
+
+    def refresh(self) -> Dict:
+        return self._state
 
     def reset_game(self) -> None:
-        self._state = initialize_game_state()
-
-# Try to use Redis, fallback to in-memory
-try:
-    # Check if Redis is available
-    r = redis.Redis.from_url("redis://localhost:6379")
-    r.ping()
-    game_state_manager = GameStateManager()
-except redis.exceptions.ConnectionError as e:
-    print(f"Redis not available, using in-memory storage: {e}")
-    game_state_manager = InMemoryGameStateManager()
+        self._state = initialize_game_state(self.rules)
+        self._saved = empty_snapshot()
+        if self.log is not None:
+            self.log.drop(self.room_id)
+
+class AsyncInMemoryGameStateManager:
+    """Awaitable wrapper so handlers can use either backend the same way"""
+
+    def __init__(self, room_id: str = "default", rules: str = DEFAULT_RULES,
+                 log: Optional[EventLog] = None, state: Optional[Dict] = None):
+        self.room_id = room_id
+        self._manager = InMemoryGameStateManager(room_id, rules, log, state)
+
+    async def get_game_state(self) -> Dict:
+        return self._manager.get_game_state()
+
+    async def save_game_state(self, state: Dict) -> None:
+        self._manager.save_game_state(state)
+
+    async def update_game_state(self, mutator: Callable[[Dict], bool]) -> Optional[Dict]:
+        return self._manager.update_game_state(mutator)
+
+    async def add_player(self, sid: str, name: str, resume_token: Optional[str] = None) -> bool:
+        return self._manager.add_player(sid, name, resume_token)
+
+    async def remove_player(self, sid: str) -> None:
+        self._manager.remove_player(sid)
+
+    async def get_player(self, sid: str) -> Optional[Player]:
+        return self._manager.get_player(sid)
+
+    async def get_alive_players(self) -> List[Player]:
+        return self._manager.get_alive_players()
+
+    async def get_players_dict(self) -> List[Dict]:
+        return self._manager.get_players_dict()
+
+    async def update_phase(self, phase: GamePhase) -> None:
+        self._manager.update_phase(phase)
+
+    async def record_night_action(self, action_type: str, player_sid: str, target_sid: Optional[str] = None) -> bool:
+        return self._manager.record_night_action(action_type, player_sid, target_sid)
+
+    async def clear_night_actions(self) -> None:
+        self._manager.clear_night_actions()
+
+    async def record_vote(self, voter_sid: str, target_sid: Optional[str]) -> bool:
+        return self._manager.record_vote(voter_sid, target_sid)
+
+    async def is_stale(self) -> bool:
+        return False
+
+    async def refresh(self) -> Dict:
+        return self._manager.refresh()
+
+    async def reset_game(self) -> None:
+        self._manager.reset_game()
+
+# How long startup waits on Redis before falling back to in-memory state
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('MAFIA_REDIS_TIMEOUT', 0.5))
+# Pooled connections idle this long are pinged before they're reused
+REDIS_HEALTH_CHECK_SECONDS = 30
+
+# Picked by connect_backend() at startup, never at import. Redis keeps its
+# own change streams; in-memory games are logged to a file.
+_redis_client: Optional[aioredis.Redis] = None
+_event_log: Optional[EventLog] = None
+
+async def connect_backend(timeout: float = REDIS_CONNECT_TIMEOUT) -> Optional[aioredis.Redis]:
+    """Use Redis if it answers within timeout, otherwise in-memory state; returns the Redis client or None"""
+    global _redis_client, _event_log
+    if REDIS_URL:
+        # One pool shared by every room; commands are multiplexed across it
+        pool = aioredis.ConnectionPool.from_url(REDIS_URL, decode_responses=True, max_connections=64,
+                                                socket_connect_timeout=timeout,
+                                                health_check_interval=REDIS_HEALTH_CHECK_SECONDS)
+        client = aioredis.Redis(connection_pool=pool)
+        try:
+            await asyncio.wait_for(client.ping(), timeout)
+            _redis_client = client
+            return client
+        except (redis.exceptions.RedisError, OSError, asyncio.TimeoutError) as e:
+            await pool.disconnect()
+            logging.warning(f"Redis not available, using in-memory storage: {e!r}")
+    else:
+        logging.info("MAFIA_REDIS_URL is empty, using in-memory storage")
+    # Opening the log replays it, so keep that off the event loop
+    _event_log = await asyncio.to_thread(EventLog, EVENT_LOG_PATH)
+    return None
+
+async def close_backend() -> None:
+    global _redis_client, _event_log
+    if _redis_client is not None:
+        await _redis_client.connection_pool.disconnect()
+        _redis_client = None
+    if _event_log is not None:
+        # Waits for the writer thread to drain the log
+        await asyncio.to_thread(_event_log.close)
+        _event_log = None
+
+async def backend_healthy(timeout: float = REDIS_CONNECT_TIMEOUT) -> bool:
+    """Whether the state backend answers; in-memory state always does"""
+    if _redis_client is None:
+        return True
+    try:
+        return await asyncio.wait_for(_redis_client.ping(), timeout)
+    except (redis.exceptions.RedisError, OSError, asyncio.TimeoutError):
+        return False
+
+def redis_reachable(timeout: float = REDIS_CONNECT_TIMEOUT) -> bool:
+    """Blocking check for code that runs before an event loop, like choosing the worker count"""
+    if not REDIS_URL:
+        return False
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=timeout, socket_timeout=timeout).ping()
+    except redis.exceptions.RedisError:
+        return False
+
+def get_redis_client() -> Optional[aioredis.Redis]:
+    """Shared async client, or None when running on in-memory state"""
+    return _redis_client
+
+def create_game_state_manager(room_id: str, rules: str = DEFAULT_RULES):
+    """Create the async state manager for one room on the available backend"""
+    if _redis_client is not None:
+        return AsyncGameStateManager(room_id=room_id, client=_redis_client, rules=rules)
+    return AsyncInMemoryGameStateManager(room_id, rules, _event_log)
+
+async def recover_rooms(skip: Iterable[str] = (),
+                        unowned: Optional[Callable[[List[str]], Awaitable[List[str]]]] = None) -> List[Dict]:
+    """Every room with stored state: room_id, rules, phase, deadline and a ready state manager.
+
+    Only a few meta fields are read per room, all in one round trip, so
+    thousands of games can be found at startup; full states load lazily.
+    With Redis, unowned narrows the rooms down first to those no node holds.
+    """
+    recovered = []
+    if _redis_client is not None:
+        room_ids = sorted(set(await _redis_client.smembers(ROOMS_KEY)) - set(skip))
+        if unowned is not None:
+            room_ids = await unowned(room_ids)
+        async with _redis_client.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                pipe.hmget(RoomKeys(room_id).meta, 'rules', 'phase', 'deadline')
+            rows = await pipe.execute() if room_ids else []
+        for room_id, (rules, phase, deadline) in zip(room_ids, rows):
+            if phase is None:
+                continue
+            rules = json.loads(rules) if rules else DEFAULT_RULES
+            recovered.append({
+                'room_id': room_id,
+                'rules': rules,
+                'phase': json.loads(phase),
+                'deadline': json.loads(deadline) if deadline else None,
+                'manager': AsyncGameStateManager(room_id=room_id, client=_redis_client, rules=rules)
+            })
+        return recovered
+
+    for room_id, (version, snapshot) in _event_log.rooms().items():
+        if room_id in skip:
+            continue
+        meta = dict(snapshot['meta'], version=version)
+        players = [snapshot['players'].get(sid, {}) for sid in snapshot['order']]
+        rules = json.loads(meta.get('rules', json.dumps(DEFAULT_RULES)))
+        state = build_state(meta, snapshot['night_actions'], snapshot['votes'], players, rules)
+        recovered.append({
+            'room_id': room_id,
+            'rules': rules,
+            'phase': state['phase'],
+            'deadline': state.get('deadline'),
+            'manager': AsyncInMemoryGameStateManager(room_id, rules, _event_log, state)
+        })
+    return recovered
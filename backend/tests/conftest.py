@@ -0,0 +1,19 @@
+import asyncio
+import importlib
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other by bare name, as they do when main.py runs directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """The server module, with its log and history database in a scratch directory"""
+    # main.py opens mafia.log, and history its database, in the working directory
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module('main')
+    yield module
+    asyncio.run(module.reset_game())
@@ -0,0 +1,85 @@
+"""Forwarded events: ordered per socket, never queued behind another socket, and unrouted when refused."""
+import asyncio
+
+from cluster import LocalBus, LocalCluster, RedisCluster
+
+
+class ScriptlessRedis:
+    def register_script(self, script):
+        async def call(keys, args, client=None):
+            return 1
+        return call
+
+
+def test_slow_forward_holds_up_only_its_own_socket():
+    async def run():
+        cluster = RedisCluster(ScriptlessRedis(), node_id='owner')
+        handled = []
+        release = asyncio.Event()
+
+        async def dispatch(event, sid, data, origin):
+            if event == 'start_game_with_ai':
+                await release.wait()
+            handled.append((sid, event))
+        cluster.on_message(dispatch)
+
+        for sid, event in [('slow', 'start_game_with_ai'), ('slow', 'vote'), ('fast', 'join_lobby'), ('fast', 'vote')]:
+            cluster._deliver({'event': event, 'sid': sid, 'data': None, 'origin': 'home'})
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert handled == [('fast', 'join_lobby'), ('fast', 'vote')]
+
+        release.set()
+        while cluster._workers:
+            await asyncio.sleep(0)
+        assert handled[2:] == [('slow', 'start_game_with_ai'), ('slow', 'vote')]
+        assert cluster._pending == {}
+    asyncio.run(run())
+
+def node_beside(main, monkeypatch, node_id: str):
+    """Make main the node node_id on a LocalBus, recording what it forwards to a node called 'home'"""
+    bus = LocalBus()
+    forwarded = []
+
+    async def home(event, sid, data, origin):
+        forwarded.append((event, sid))
+    bus.nodes['home'] = home
+    monkeypatch.setattr(main, 'cluster', LocalCluster(node_id, bus))
+    main.cluster.on_message(main.on_forwarded)
+    return bus, forwarded
+
+def test_refused_forwarded_join_unroutes_the_socket(main, monkeypatch):
+    async def run():
+        bus, forwarded = node_beside(main, monkeypatch, 'owner')
+        main.rooms.join('seated', 'busy')
+        main.rooms.mark_started('busy')
+        await main.on_forwarded('join_lobby', 'late', {'name': 'Late', 'room_id': 'busy'}, 'home')
+        assert forwarded == [('unroute', 'late')]
+        assert 'late' not in main.remote_sids
+
+        # A room this node doesn't host is turned down too, never forwarded on to a third node
+        bus.owners['elsewhere'] = 'third'
+        await main.on_forwarded('join_lobby', 'lost', {'name': 'Lost', 'room_id': 'elsewhere'}, 'home')
+        assert forwarded[1:] == [('unroute', 'lost')]
+        assert 'lost' not in main.remote_sids
+    asyncio.run(run())
+
+def test_accepted_forwarded_join_keeps_the_route(main, monkeypatch):
+    async def run():
+        _, forwarded = node_beside(main, monkeypatch, 'owner')
+        await main.on_forwarded('join_lobby', 'guest', {'name': 'Guest', 'room_id': 'open'}, 'home')
+        assert ('unroute', 'guest') not in forwarded
+        assert main.remote_sids['guest'] == 'home'
+        await main.on_forwarded('disconnect', 'guest', None, 'home')
+        assert 'guest' not in main.remote_sids
+    asyncio.run(run())
+
+def test_unroute_only_from_the_routed_owner(main, monkeypatch):
+    async def run():
+        node_beside(main, monkeypatch, 'home-node')
+        main.remote_rooms['sock'] = 'owner'
+        await main.on_forwarded('unroute', 'sock', None, 'someone-else')
+        assert main.remote_rooms['sock'] == 'owner'
+        await main.on_forwarded('unroute', 'sock', None, 'owner')
+        assert 'sock' not in main.remote_rooms
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+"""Night actions are only recorded at seated players who are still alive."""
+import asyncio
+
+from game import Player, Role, add_player, initialize_game_state, process_night_actions, start_night_phase
+from state import apply_night_action
+
+from test_repeated_actions import seat_table
+
+
+def night_table():
+    """A Nightmare, a Detective and two villagers, one of them already dead"""
+    state = initialize_game_state()
+    for sid, role in [('nightmare', Role.NIGHTMARE), ('detective', Role.DETECTIVE),
+                      ('alive', Role.VILLAGER), ('dead', Role.VILLAGER)]:
+        player = Player(sid, sid.title())
+        player.role = role
+        add_player(state, player)
+    state['player_index']['dead'].alive = False
+    start_night_phase(state)
+    return state
+
+def test_kill_needs_a_living_seated_target():
+    state = night_table()
+    for target in (None, 'nobody', 'dead'):
+        assert not apply_night_action(state, 'kill', 'nightmare', target)
+    assert state['night_actions']['kill_target'] is None
+    assert apply_night_action(state, 'kill', 'nightmare', 'alive')
+    assert state['night_actions']['kill_target'] == 'alive'
+
+def test_refused_kill_does_not_kill_twice():
+    state = night_table()
+    apply_night_action(state, 'kill', 'nightmare', 'dead')
+    process_night_actions(state)
+    assert state['deaths'] == []
+
+def test_handler_refuses_a_dead_target(main):
+    def bury(state):
+        state['player_index']['ai_0'].alive = False
+        return True
+
+    async def run():
+        room = await seat_table(main, 'graves', start_night_phase)
+        await room.state_manager.update_game_state(bury)
+        await main.night_action('detective', {'action': 'detective_inspect', 'target': 'ai_0'})
+        state = await room.state_manager.get_game_state()
+        assert state['night_actions']['detective_inspection'] is None
+    asyncio.run(run())
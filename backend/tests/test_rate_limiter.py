@@ -0,0 +1,65 @@
+"""Client event limits: a burst per socket and per table, refilled over time, told once per run of refusals."""
+from limits import ROOM_LIMITS_PER_SEAT, SID_LIMITS, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_socket_gets_its_burst_then_refills():
+    clock = Clock()
+    limiter = RateLimiter(clock)
+    rate, burst = SID_LIMITS['vote']
+    assert all(limiter.allow('vote', 'sid') for _ in range(int(burst)))
+    assert not limiter.allow('vote', 'sid')
+    clock.now += 1 / rate
+    assert limiter.allow('vote', 'sid')
+    assert not limiter.allow('vote', 'sid')
+
+def test_sockets_and_events_have_separate_buckets():
+    limiter = RateLimiter(Clock())
+    _, burst = SID_LIMITS['vote']
+    for _ in range(int(burst)):
+        limiter.allow('vote', 'loud')
+    assert not limiter.allow('vote', 'loud')
+    assert limiter.allow('vote', 'quiet')
+    assert limiter.allow('night_action', 'loud')
+
+def test_unlimited_events_always_pass():
+    limiter = RateLimiter(Clock())
+    assert all(limiter.allow('disconnect', 'sid', 'room') for _ in range(100))
+
+def test_table_bucket_scales_with_capacity():
+    limiter = RateLimiter(Clock())
+    _, burst = ROOM_LIMITS_PER_SEAT['vote']
+    capacity = 3
+    # Each socket stays within its own burst, so only the table's limit applies
+    allowed = sum(limiter.allow('vote', f"sid{n}", 'table', capacity) for n in range(20))
+    assert allowed == int(burst * capacity)
+    assert limiter.allow('vote', 'sid0', 'other', capacity)
+
+def test_first_rejection_is_reported_once_per_run():
+    clock = Clock()
+    limiter = RateLimiter(clock)
+    rate, burst = SID_LIMITS['vote']
+    for _ in range(int(burst)):
+        limiter.allow('vote', 'sid')
+    assert not limiter.allow('vote', 'sid')
+    assert limiter.first_rejection('vote', 'sid')
+    assert not limiter.allow('vote', 'sid')
+    assert not limiter.first_rejection('vote', 'sid')
+    clock.now += 1 / rate
+    assert limiter.allow('vote', 'sid')
+    assert not limiter.allow('vote', 'sid')
+    assert limiter.first_rejection('vote', 'sid')
+
+def test_forgotten_socket_starts_over():
+    limiter = RateLimiter(Clock())
+    _, burst = SID_LIMITS['vote']
+    for _ in range(int(burst)):
+        limiter.allow('vote', 'sid')
+    limiter.forget_sid('sid')
+    assert limiter.allow('vote', 'sid')
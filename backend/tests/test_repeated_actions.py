@@ -0,0 +1,50 @@
+"""Repeated night actions and votes skip the state write, but a changed mind never does."""
+import asyncio
+
+from game import Role, index_players, start_day_phase, start_game_with_ai, start_night_phase
+
+async def seat_table(main, room_id: str, begin_phase):
+    """Two humans, a Detective and a Nightmare, with AIs filling the other seats"""
+    room = main.rooms.join('detective', room_id)
+    main.rooms.join('nightmare', room_id)
+    await room.state_manager.add_player('detective', 'Dee')
+    await room.state_manager.add_player('nightmare', 'Nia')
+
+    def begin(state):
+        start_game_with_ai(state)
+        for player in state['players']:
+            player.role = {'detective': Role.DETECTIVE, 'nightmare': Role.NIGHTMARE}.get(player.sid, Role.VILLAGER)
+        index_players(state)
+        begin_phase(state)
+        return True
+
+    await room.state_manager.update_game_state(begin)
+    main.rooms.mark_started(room_id)
+    return room
+
+def test_vote_switched_back_is_recorded(main):
+    async def run():
+        room = await seat_table(main, 'votes', start_day_phase)
+        for target in ('ai_0', 'ai_1', 'ai_0'):
+            await main.vote('detective', {'target': target})
+        state = await room.state_manager.get_game_state()
+        assert state['votes']['detective'] == 'ai_0'
+    asyncio.run(run())
+
+def test_night_action_switched_back_is_recorded(main):
+    async def run():
+        room = await seat_table(main, 'nights', start_night_phase)
+        for target in ('ai_0', 'ai_1', 'ai_0'):
+            await main.night_action('detective', {'action': 'detective_inspect', 'target': target})
+        state = await room.state_manager.get_game_state()
+        assert state['night_actions']['detective_inspection'] == 'ai_0'
+    asyncio.run(run())
+
+def test_repeated_vote_skips_the_write(main):
+    async def run():
+        room = await seat_table(main, 'repeats', start_day_phase)
+        await main.vote('detective', {'target': 'ai_0'})
+        version = (await room.state_manager.get_game_state())['version']
+        await main.vote('detective', {'target': 'ai_0'})
+        assert (await room.state_manager.get_game_state())['version'] == version
+    asyncio.run(run())
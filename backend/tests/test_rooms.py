@@ -0,0 +1,28 @@
+"""Replay for resuming clients: only events of the same run of a room, and only while they are kept."""
+from rooms import REPLAY_EVENTS, Room
+
+
+def room_with_events(count: int) -> Room:
+    room = Room('table', state_manager=None)
+    for _ in range(count):
+        room.seq += 1
+        room.recent.append((room.seq, 'player_joined', {'seq': room.seq}))
+    return room
+
+def test_replays_what_was_missed():
+    room = room_with_events(5)
+    assert [seq for seq, _, _ in room.missed_since(room.epoch, 2)] == [3, 4, 5]
+    assert room.missed_since(room.epoch, 5) == []
+
+def test_seq_from_another_run_gets_a_snapshot():
+    before = room_with_events(40)
+    # Recovered on another node: the sequence starts again below what the client saw
+    after = room_with_events(50)
+    assert after.epoch != before.epoch
+    assert after.missed_since(before.epoch, 40) is None
+    assert after.missed_since(None, 40) is None
+
+def test_seq_beyond_the_buffer_gets_a_snapshot():
+    room = room_with_events(REPLAY_EVENTS + 10)
+    assert room.missed_since(room.epoch, 5) is None
+    assert room.missed_since(room.epoch, room.seq + 1) is None
@@ -0,0 +1,65 @@
+"""Phase deadlines: each room fires once, at its latest deadline, and never after a cancel."""
+import asyncio
+
+from scheduler import PhaseScheduler
+
+
+def fired_after(plan, wait: float = 0.2):
+    """Run plan(scheduler, callback) and return the rooms fired within wait seconds, in order"""
+    fired = []
+
+    async def run():
+        scheduler = PhaseScheduler()
+
+        async def callback(room_id):
+            fired.append(room_id)
+        plan(scheduler, callback)
+        await asyncio.sleep(wait)
+        await scheduler.stop()
+    asyncio.run(run())
+    return fired
+
+def test_rooms_fire_in_deadline_order():
+    def plan(scheduler, callback):
+        scheduler.schedule('late', 0.04, callback)
+        scheduler.schedule('early', 0.01, callback)
+    assert fired_after(plan) == ['early', 'late']
+
+def test_rescheduling_replaces_the_deadline():
+    def plan(scheduler, callback):
+        scheduler.schedule('table', 5, callback)
+        scheduler.schedule('table', 0.01, callback)
+        assert scheduler.pending() == 1
+    assert fired_after(plan) == ['table']
+
+def test_pushing_a_deadline_back_fires_only_once():
+    def plan(scheduler, callback):
+        scheduler.schedule('table', 0.01, callback)
+        scheduler.schedule('table', 0.1, callback)
+    assert fired_after(plan, wait=0.05) == []
+    assert fired_after(plan) == ['table']
+
+def test_cancelled_deadline_never_fires():
+    def plan(scheduler, callback):
+        scheduler.schedule('table', 0.01, callback)
+        assert scheduler.cancel('table')
+        assert not scheduler.cancel('table')
+        assert scheduler.deadline('table') is None
+    assert fired_after(plan) == []
+
+def test_cancel_then_reschedule_fires_the_new_deadline():
+    def plan(scheduler, callback):
+        scheduler.schedule('table', 0.01, callback)
+        scheduler.cancel('table')
+        scheduler.schedule('table', 0.02, callback)
+    assert fired_after(plan) == ['table']
+
+def test_cancelled_entries_do_not_pile_up():
+    def plan(scheduler, callback):
+        for n in range(200):
+            scheduler.schedule(f"room{n}", 60, callback)
+        for n in range(190):
+            scheduler.cancel(f"room{n}")
+        assert scheduler.pending() == 10
+        assert len(scheduler._heap) <= 64
+    assert fired_after(plan, wait=0) == []
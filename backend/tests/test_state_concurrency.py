@@ -0,0 +1,192 @@
+"""Concurrent writers against both state backends.
+
+Handlers on one event loop, and workers sharing one Redis, interleave
+their updates. A full table must never take another seat, and a write
+that loses a compare-and-set must be retried rather than dropped.
+"""
+import asyncio
+
+from game import RULE_SETS, DEFAULT_RULES, NIGHT_ACTION_ROLES, assign_roles, index_players, start_night_phase
+from metrics import STATE_CONFLICTS
+from state import (APPLY_IF_CURRENT, DELETE_ROOM, NIGHT_ACTION_FIELDS, AsyncGameStateManager,
+                   AsyncInMemoryGameStateManager)
+from wire import decode_ops
+
+MAX_PLAYERS = RULE_SETS[DEFAULT_RULES].max_players
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for AsyncGameStateManager, with APPLY_IF_CURRENT's compare-and-set.
+
+    Every call yields to the event loop first, so concurrent managers
+    interleave between loading a state and saving it.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def register_script(self, script):
+        run = {APPLY_IF_CURRENT: self._apply_if_current, DELETE_ROOM: self._delete_room}[script]
+
+        async def call(keys, args):
+            await asyncio.sleep(0)
+            return run(keys, args)
+        return call
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _apply_if_current(self, keys, args):
+        version, ops, _, codec = args
+        if int(self.data.get(keys[0], {}).get('version', 0)) != int(version):
+            return -1
+        for op in decode_ops(ops, codec):
+            self.execute(*op)
+        new_version = self.execute('HINCRBY', keys[0], 'version', 1)
+        self.data.setdefault(keys[1], []).append(ops)
+        return new_version
+
+    def _delete_room(self, keys, args):
+        for sid in self.execute('LRANGE', keys[0], 0, -1):
+            self.data.pop(args[0] + sid, None)
+        for key in keys:
+            self.data.pop(key, None)
+        return 1
+
+    def execute(self, command, key, *args):
+        command = command.upper()
+        if command == 'DEL':
+            for name in (key,) + args:
+                self.data.pop(name, None)
+        elif command == 'HSET':
+            self.data.setdefault(key, {}).update(zip(args[::2], args[1::2]))
+        elif command == 'HDEL':
+            for field in args:
+                self.data.get(key, {}).pop(field, None)
+        elif command == 'HINCRBY':
+            fields = self.data.setdefault(key, {})
+            fields[args[0]] = str(int(fields.get(args[0], 0)) + int(args[1]))
+            return int(fields[args[0]])
+        elif command == 'HGET':
+            return self.data.get(key, {}).get(args[0])
+        elif command == 'HGETALL':
+            return dict(self.data.get(key, {}))
+        elif command == 'RPUSH':
+            self.data.setdefault(key, []).extend(args)
+        elif command == 'LREM':
+            self.data[key] = [item for item in self.data.get(key, []) if item != args[1]]
+        elif command == 'LRANGE':
+            return list(self.data.get(key, []))
+        elif command == 'SADD':
+            self.data.setdefault(key, set()).update(args)
+        elif command == 'SREM':
+            self.data.get(key, set()).difference_update(args)
+        elif command == 'SMEMBERS':
+            return set(self.data.get(key, set()))
+        else:
+            raise NotImplementedError(command)
+
+    def __getattr__(self, name):
+        async def command(key, *args):
+            await asyncio.sleep(0)
+            return self.execute(name, key, *args)
+        return command
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(key, *args):
+            self.calls.append((name, key) + args)
+        return queue
+
+    async def execute(self):
+        await asyncio.sleep(0)
+        calls, self.calls = self.calls, []
+        return [self.redis.execute(*call) for call in calls]
+
+
+def redis_workers(count: int):
+    """State managers for one room on separate workers sharing one Redis"""
+    redis = FakeRedis()
+    return [AsyncGameStateManager(room_id='table', client=redis) for _ in range(count)]
+
+def in_memory_workers(count: int):
+    """Handlers on one worker all share the room's single manager"""
+    return [AsyncInMemoryGameStateManager('table')] * count
+
+def conflicts() -> float:
+    return STATE_CONFLICTS._values[()]
+
+async def seat_everyone(managers, players: int):
+    return await asyncio.gather(*(managers[i % len(managers)].add_player(f"sid{i}", f"Player {i}")
+                                  for i in range(players)))
+
+async def fill_table(managers):
+    assert all(await seat_everyone(managers, MAX_PLAYERS))
+
+    def begin(state):
+        assign_roles(state['players'], RULE_SETS[DEFAULT_RULES])
+        index_players(state)
+        start_night_phase(state)
+        return True
+
+    # Pick up the seats other workers wrote before starting from this one
+    await managers[0].refresh()
+    return await managers[0].update_game_state(begin)
+
+async def night_actors(managers):
+    state = await fill_table(managers)
+    field_actions = {field: action for action, field in NIGHT_ACTION_FIELDS.items()}
+    actors = [(player.sid, field_actions[NIGHT_ACTION_ROLES[player.role]]) for player in state['players']
+              if NIGHT_ACTION_ROLES.get(player.role) in field_actions]
+    assert len(actors) >= 2
+    # Every worker has loaded the started game; from here on only conflicts can make a cache stale
+    await asyncio.gather(*(manager.refresh() for manager in managers))
+    return actors
+
+
+def test_in_memory_table_never_overfills():
+    async def run():
+        managers = in_memory_workers(8)
+        seated = await seat_everyone(managers, MAX_PLAYERS * 3)
+        state = await managers[0].get_game_state()
+        assert sum(seated) == MAX_PLAYERS
+        assert len(state['players']) == MAX_PLAYERS
+    asyncio.run(run())
+
+def test_redis_table_never_overfills_and_conflicts_retry():
+    async def run():
+        managers = redis_workers(8)
+        before = conflicts()
+        seated = await seat_everyone(managers, MAX_PLAYERS * 3)
+        assert conflicts() > before
+        assert sum(seated) == MAX_PLAYERS
+        # A fresh worker reads exactly the players whose add succeeded
+        state = await AsyncGameStateManager(room_id='table', client=managers[0].redis).get_game_state()
+        assert [p.sid for p in state['players']] == [f"sid{i}" for i, ok in enumerate(seated) if ok]
+    asyncio.run(run())
+
+def test_concurrent_night_actions_are_all_kept():
+    for make_workers in (in_memory_workers, redis_workers):
+        async def run():
+            managers = make_workers(8)
+            actors = await night_actors(managers)
+            before = conflicts()
+            recorded = await asyncio.gather(*(managers[i % len(managers)].record_night_action(action, sid, 'sid0')
+                                              for i, (sid, action) in enumerate(actors)))
+            assert all(recorded)
+            if make_workers is redis_workers:
+                assert conflicts() > before
+            state = await managers[0].refresh()
+            assert state['night_actions'] == {NIGHT_ACTION_FIELDS[action]: 'sid0' for _, action in actors}
+        asyncio.run(run())
@@ -0,0 +1,51 @@
+"""The incremental vote ledger always agrees with a full recount of the votes."""
+import random
+from collections import Counter
+
+from game import VoteLedger
+
+
+def recount(votes):
+    """Who a full recount eliminates: the sole player with the most votes, if any"""
+    counts = Counter(votes.values()).most_common()
+    if not counts or (len(counts) > 1 and counts[0][1] == counts[1][1]):
+        return None
+    return counts[0][0]
+
+def test_switching_away_from_a_tied_leader_breaks_the_tie():
+    ledger = VoteLedger({'v1': 'a', 'v2': 'a', 'v3': 'b', 'v4': 'b'})
+    assert ledger.result() is None
+    ledger.cast('v1', 'c')
+    assert ledger.result() == 'b'
+    assert ledger.counts == {'a': 1, 'b': 2, 'c': 1}
+
+def test_switching_away_from_the_leader_recounts():
+    ledger = VoteLedger({'v1': 'a', 'v2': 'a', 'v3': 'b'})
+    assert ledger.result() == 'a'
+    ledger.cast('v1', 'b')
+    assert ledger.result() == 'b'
+    ledger.cast('v2', 'c')
+    assert ledger.result() == 'b'
+    ledger.cast('v3', 'c')
+    assert ledger.result() == 'c'
+
+def test_repeat_vote_changes_nothing():
+    ledger = VoteLedger({'v1': 'a'})
+    ledger.cast('v1', 'a')
+    assert ledger.counts == {'a': 1}
+    assert ledger.result() == 'a'
+
+def test_no_votes_eliminates_nobody():
+    assert VoteLedger().result() is None
+
+def test_matches_a_full_recount():
+    rng = random.Random(7)
+    voters, targets = [f"v{n}" for n in range(9)], ['a', 'b', 'c', 'd']
+    for _ in range(200):
+        ledger, votes = VoteLedger(), {}
+        for _ in range(rng.randint(1, 30)):
+            voter, target = rng.choice(voters), rng.choice(targets)
+            ledger.cast(voter, target)
+            votes[voter] = target
+            assert ledger.result() == recount(votes)
+            assert ledger.counts == dict(Counter(votes.values()))
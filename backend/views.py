@@ -0,0 +1,65 @@
+"""Projections of a game state into what each class of recipient may see.
+
+Recipients are grouped into view classes (everyone at the table, the evil
+team, the Detective). Each class has its own Socket.IO room, so a view is
+projected once per state version and encoded once per emit, however many
+sockets receive it.
+"""
+from typing import Dict, List, Tuple
+from game import Player, Role, EVIL_ROLES
+
+PUBLIC = 'public'
+
+# View class -> roles whose holders receive it
+VIEW_ROLES = {
+    'evil': EVIL_ROLES,
+    'detective': {Role.DETECTIVE}
+}
+
+def view_room(room_id: str, view: str) -> str:
+    """Socket.IO room for one view class of a table"""
+    return room_id if view == PUBLIC else f"{room_id}:{view}"
+
+def views_for(player: Player) -> List[str]:
+    """Private view classes a player belongs to"""
+    return [view for view, roles in VIEW_ROLES.items() if player.role in roles]
+
+def project(state: Dict, view: str) -> Dict:
+    if view == PUBLIC:
+        return {
+            'phase': state['phase'],
+            'players': [p.to_public_dict() for p in state['players']]
+        }
+    inspections = state.get('inspections') or {}
+    if view == 'evil':
+        # Nightmare and Witch know each other and share the Witch's findings
+        return {
+            'team': [{'sid': p.sid, 'name': p.name, 'role': p.role.value, 'alive': p.alive}
+                     for p in state['players'] if p.role in EVIL_ROLES],
+            'inspections': inspections.get('witch', {})
+        }
+    if view == 'detective':
+        return {'inspections': inspections.get('detective', {})}
+    raise ValueError(f"Unknown view '{view}'")
+
+class ViewCache:
+    """Projected views per room, valid until the state version changes"""
+
+    def __init__(self):
+        self._views: Dict[Tuple[str, str], Tuple[int, Dict]] = {}
+
+    def get(self, room_id: str, view: str, state: Dict) -> Dict:
+        key = (room_id, view)
+        cached = self._views.get(key)
+        if cached is not None and cached[0] == state['version']:
+            return cached[1]
+        payload = project(state, view)
+        self._views[key] = (state['version'], payload)
+        return payload
+
+    def drop(self, room_id: str) -> None:
+        for view in [PUBLIC] + list(VIEW_ROLES):
+            self._views.pop((room_id, view), None)
+
+    def clear(self) -> None:
+        self._views.clear()
@@ -0,0 +1,49 @@
+"""Opt-in MessagePack encoding for socket traffic and Redis writes.
+
+JSON stays the default everywhere. Two switches turn MessagePack on:
+
+    MAFIA_WIRE_FORMAT=msgpack   Socket.IO packets between server and clients;
+                                the frontend must be built with
+                                REACT_APP_WIRE_FORMAT=msgpack to match
+    MAFIA_STATE_CODEC=msgpack   the op batch sent to Redis with each saved change
+
+Both need the msgpack package; without it the server stays on JSON.
+"""
+import json
+import logging
+import os
+from typing import List
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ('json', 'msgpack')
+
+def _format(variable: str) -> str:
+    name = os.environ.get(variable, 'json').lower()
+    if name not in FORMATS:
+        raise ValueError(f"{variable} must be one of {', '.join(FORMATS)}, not '{name}'")
+    if name == 'msgpack' and msgpack is None:
+        logging.warning(f"{variable}=msgpack but the msgpack package is not installed, using JSON")
+        return 'json'
+    return name
+
+WIRE_FORMAT = _format('MAFIA_WIRE_FORMAT')
+STATE_CODEC = _format('MAFIA_STATE_CODEC')
+
+def socketio_serializer(wire_format: str = WIRE_FORMAT) -> str:
+    """The serializer argument for socketio.AsyncServer and AsyncClient"""
+    return 'msgpack' if wire_format == 'msgpack' else 'default'
+
+def encode_ops(ops: List[List[str]], codec: str = STATE_CODEC):
+    """Encode a batch of Redis ops for the APPLY_IF_CURRENT script, which decodes it with cjson or cmsgpack"""
+    if codec == 'msgpack':
+        return msgpack.packb(ops)
+    return json.dumps(ops, separators=(',', ':'))
+
+def decode_ops(data, codec: str = STATE_CODEC) -> List[List[str]]:
+    if codec == 'msgpack':
+        return msgpack.unpackb(data)
+    return json.loads(data)
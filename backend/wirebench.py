@@ -0,0 +1,156 @@
+"""JSON vs MessagePack: encode/decode time and bytes for real game traffic.
+
+    python wirebench.py --games 200
+    python wirebench.py --games 50 --rules event --table-size 50 --json > wire.json
+
+Payloads come from seeded all-AI games. The socket messages are the ones
+main.py emits to a table, and each is framed by python-socketio's own
+packet classes. The op batches are the ones state.py sends to Redis for
+each saved change. Every payload is encoded and decoded with both formats.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, List, Tuple
+from socketio.packet import Packet, EVENT
+from socketio.msgpack_packet import MsgPackPacket
+from game import (GamePhase, RULE_SETS, DEFAULT_RULES, initialize_game_state, start_game_with_ai,
+                  start_night_phase, start_day_phase, check_win_conditions)
+from ai import run_night, run_day
+from views import PUBLIC, VIEW_ROLES, project
+from wire import FORMATS, encode_ops, decode_ops
+from simulate import MAX_ROUNDS
+from state import RoomKeys, diff_snapshots, empty_snapshot, snapshot_state
+
+PACKETS = {'json': Packet, 'msgpack': MsgPackPacket}
+
+def collect_payloads(games: int, seed: int, rules: str, table_size: int = None) -> Tuple[List, List]:
+    """Socket messages (event, payload) and Redis op batches from seeded games"""
+    messages, batches = [], []
+    for game in range(games):
+        rng = random.Random(seed + game)
+        keys = RoomKeys(f"bench-{game}")
+        saved = empty_snapshot()
+
+        def save(state: Dict) -> None:
+            nonlocal saved
+            snapshot = snapshot_state(state)
+            batches.append(diff_snapshots(keys, saved, snapshot))
+            saved = snapshot
+
+        def emit_views(state: Dict, seq: int) -> None:
+            messages.append(('roster_snapshot', {'seq': seq, 'players': project(state, PUBLIC)['players']}))
+            for view in VIEW_ROLES:
+                messages.append(('private_view', {'view': view, **project(state, view)}))
+
+        state = initialize_game_state(rules)
+        start_game_with_ai(state, table_size, rng)
+        start_night_phase(state)
+        save(state)
+        emit_views(state, 0)
+        human = state['players'][0]
+        messages.append(('role_assigned', {'role': human.role.value, 'name': human.name}))
+
+        for round_number in range(1, MAX_ROUNDS + 1):
+            messages.append(('phase_change', {'phase': 'night', 'message': 'Night phase begins!'}))
+            run_night(state, rng)
+            check_win_conditions(state)
+            save(state)
+            emit_views(state, round_number)
+            if state['deaths']:
+                messages.append(('player_died', {'sids': state['deaths'], 'seq': round_number}))
+            if state['phase'] == GamePhase.GAME_OVER.value:
+                break
+            start_day_phase(state)
+            save(state)
+            messages.append(('phase_change', {'phase': 'day', 'message': 'Day phase begins! Time to vote.'}))
+            run_day(state, rng)
+            check_win_conditions(state)
+            save(state)
+            messages.append(('day_results', {'eliminated': state.get('eliminated'), 'message': 'Day over'}))
+            if state['phase'] == GamePhase.GAME_OVER.value:
+                break
+            start_night_phase(state)
+        messages.append(('game_over', {'winner': state.get('winner')}))
+    return messages, batches
+
+def measure(encode, decode, payloads: List, repeat: int) -> Dict:
+    encoded = [encode(payload) for payload in payloads]
+    sizes = [len(data.encode() if isinstance(data, str) else data) for data in encoded]
+
+    started = time.perf_counter_ns()
+    for _ in range(repeat):
+        for payload in payloads:
+            encode(payload)
+    encode_ns = (time.perf_counter_ns() - started) / (repeat * len(payloads))
+
+    started = time.perf_counter_ns()
+    for _ in range(repeat):
+        for data in encoded:
+            decode(data)
+    decode_ns = (time.perf_counter_ns() - started) / (repeat * len(payloads))
+
+    return {
+        'payloads': len(payloads),
+        'total_bytes': sum(sizes),
+        'mean_bytes': sum(sizes) / len(sizes) if sizes else 0.0,
+        'encode_us': encode_ns / 1000,
+        'decode_us': decode_ns / 1000
+    }
+
+def run_wirebench(games: int, seed: int = 0, rules: str = DEFAULT_RULES, table_size: int = None,
+                  repeat: int = 5) -> Dict:
+    messages, batches = collect_payloads(games, seed, rules, table_size)
+    results: Dict[str, Dict] = {'socket': {}, 'redis_ops': {}}
+    for name in FORMATS:
+        packet_class = PACKETS[name]
+        results['socket'][name] = measure(
+            lambda message: packet_class(EVENT, data=list(message), namespace='/').encode(),
+            lambda data: packet_class(encoded_packet=data),
+            messages, repeat)
+        results['redis_ops'][name] = measure(
+            lambda ops: encode_ops(ops, name),
+            lambda data: decode_ops(data, name),
+            batches, repeat)
+    return {
+        'rules': rules,
+        'table_size': table_size,
+        'games': games,
+        'seed': seed,
+        'repeat': repeat,
+        **results
+    }
+
+def print_report(report: Dict) -> None:
+    size = report['table_size'] or RULE_SETS[report['rules']].min_players
+    print(f"{report['games']} games ({report['rules']}, {size} players), each payload coded {report['repeat']}x")
+    for kind in ('socket', 'redis_ops'):
+        rows = report[kind]
+        base = rows['json']
+        print(f"  {kind:<10} {'format':<8} {'payloads':>9} {'mean B':>8} {'enc us':>8} {'dec us':>8} "
+              f"{'bytes':>7} {'enc':>7} {'dec':>7}")
+        for name, stats in rows.items():
+            print(f"  {'':<10} {name:<8} {stats['payloads']:>9} {stats['mean_bytes']:>8.1f} "
+                  f"{stats['encode_us']:>8.2f} {stats['decode_us']:>8.2f} "
+                  f"{stats['total_bytes'] / base['total_bytes']:>7.0%} "
+                  f"{stats['encode_us'] / base['encode_us']:>7.0%} {stats['decode_us'] / base['decode_us']:>7.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and MessagePack on socket and Redis payloads")
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rules', choices=sorted(RULE_SETS), default=DEFAULT_RULES)
+    parser.add_argument('--table-size', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=5, help="times each payload is encoded and decoded")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_wirebench(args.games, args.seed, args.rules, args.table_size, args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import socket from './sockets';
 import GameCanvas from './GameCanvas';
 import './App.css';
 
+// Tables are addressed as /?room=<room_id>; without one the server matchmakes
+const params = new URLSearchParams(window.location.search);
+const requestedRoom = params.get('room');
+// /?room=<room_id>&watch=1 follows a table as a spectator instead of taking a seat
+const watching = requestedRoom !== null && params.has('watch');
+
+// Lets this tab take its seat back after a dropped connection or a reload
+const RESUME_TOKEN_KEY = 'mafia.resumeToken';
+
 function App() {
   const [playerName, setPlayerName] = useState('');
   const [isConnected, setIsConnected] = useState(false);
@@ -11,12 +20,26 @@ function App() {
   const [myRole, setMyRole] = useState(null);
   const [gameStarted, setGameStarted] = useState(false);
   const [messages, setMessages] = useState([]);
+  const [roomId, setRoomId] = useState(requestedRoom);
+  const [capacity, setCapacity] = useState(7);
+  const [spectating, setSpectating] = useState(false);
+  // Sequence number of the last table event applied; -1 until the first snapshot
+  const tableSeq = useRef(-1);
+  // Which run of the room tableSeq counts in; a room recovered on another server starts again
+  const tableEpoch = useRef(null);
 
   useEffect(() => {
     // Socket event listeners
     socket.on('connect', () => {
       setIsConnected(true);
       addMessage('Connected to server');
+      const token = sessionStorage.getItem(RESUME_TOKEN_KEY);
+      if (watching) {
+        socket.emit('spectate', { room_id: requestedRoom });
+      } else if (token) {
+        // The server replays what we missed since tableSeq, or sends a snapshot
+        socket.emit('resume', { token, seq: tableSeq.current, epoch: tableEpoch.current });
+      }
     });
 
     socket.on('disconnect', () => {
@@ -28,12 +51,68 @@ function App() {
       addMessage(data.data);
     });
 
-    socket.on('lobby_update', (data) => {
-      setPlayers(data);
+    socket.on('room_joined', (data) => {
+      setRoomId(data.room_id);
+      setCapacity(data.capacity);
+      sessionStorage.setItem(RESUME_TOKEN_KEY, data.resume_token);
+      tableEpoch.current = data.epoch;
+      addMessage(data.resumed ? `Rejoined room ${data.room_id}` : `Joined room ${data.room_id}`);
+    });
+
+    socket.on('spectating', (data) => {
+      setRoomId(data.room_id);
+      setCapacity(data.capacity);
+      setSpectating(true);
+      setGameStarted(true);
+      addMessage(data.delay > 0
+        ? `Watching room ${data.room_id}, ${data.delay}s behind the table`
+        : `Watching room ${data.room_id}`);
+    });
+
+    // Table events arrive in order; repeats are skipped, and a gap means we
+    // missed one, so resync from a snapshot
+    const inOrder = (data) => {
+      if (tableSeq.current < 0 || data.seq <= tableSeq.current) {
+        return false;
+      }
+      if (data.seq !== tableSeq.current + 1) {
+        // Spectators have no seat to resync from; watching again brings a fresh snapshot
+        socket.emit(watching ? 'spectate' : 'request_snapshot', watching ? { room_id: requestedRoom } : {});
+        return false;
+      }
+      tableSeq.current = data.seq;
+      return true;
+    };
+
+    const applyDelta = (data, update) => {
+      if (inOrder(data)) {
+        setPlayers(update);
+      }
+    };
+
+    socket.on('roster_snapshot', (data) => {
+      tableSeq.current = data.seq;
+      setPlayers(data.players);
+      setCurrentPhase(data.phase);
+    });
+
+    socket.on('player_joined', (data) => {
+      applyDelta(data, (prev) => [...prev, ...data.players]);
+    });
+
+    socket.on('player_left', (data) => {
+      applyDelta(data, (prev) => prev.filter((p) => p.sid !== data.sid));
+    });
+
+    socket.on('player_died', (data) => {
+      const dead = new Set(data.sids);
+      applyDelta(data, (prev) => prev.map((p) => (dead.has(p.sid) ? { ...p, alive: false } : p)));
     });
 
     socket.on('ready_to_start', (data) => {
-      addMessage(data.message);
+      if (inOrder(data)) {
+        addMessage(data.message);
+      }
     });
 
     socket.on('role_assigned', (data) => {
@@ -43,20 +122,48 @@ function App() {
     });
 
     socket.on('phase_change', (data) => {
-      setCurrentPhase(data.phase);
-      addMessage(data.message);
+      if (inOrder(data)) {
+        setCurrentPhase(data.phase);
+        addMessage(data.message);
+      }
     });
 
     socket.on('night_results', (data) => {
-      addMessage(data.message);
+      if (inOrder(data)) {
+        addMessage(data.message);
+      }
+    });
+
+    socket.on('day_results', (data) => {
+      if (inOrder(data)) {
+        addMessage(data.message);
+      }
+    });
+
+    socket.on('private_view', (data) => {
+      const findings = Object.entries(data.inspections)
+        .map(([sid, result]) => `${sid}: ${result}`)
+        .join(', ');
+      if (data.view === 'evil') {
+        addMessage(`Your team: ${data.team.map((p) => `${p.name} (${p.role})`).join(', ')}`);
+      }
+      if (findings) {
+        addMessage(`Inspections: ${findings}`);
+      }
     });
 
     socket.on('game_over', (data) => {
-      addMessage(`Game Over! Winner: ${data.winner}`);
-      setCurrentPhase('game_over');
+      if (inOrder(data)) {
+        addMessage(`Game Over! Winner: ${data.winner}`);
+        setCurrentPhase('game_over');
+      }
     });
 
     socket.on('error', (data) => {
+      if (data.message.startsWith('Session expired')) {
+        sessionStorage.removeItem(RESUME_TOKEN_KEY);
+        tableSeq.current = -1;
+      }
       addMessage(`Error: ${data.message}`);
     });
 
@@ -64,11 +171,18 @@ function App() {
       socket.off('connect');
       socket.off('disconnect');
       socket.off('message');
-      socket.off('lobby_update');
+      socket.off('room_joined');
+      socket.off('spectating');
+      socket.off('roster_snapshot');
+      socket.off('player_joined');
+      socket.off('player_left');
+      socket.off('player_died');
       socket.off('ready_to_start');
       socket.off('role_assigned');
       socket.off('phase_change');
       socket.off('night_results');
+      socket.off('day_results');
+      socket.off('private_view');
       socket.off('game_over');
       socket.off('error');
     };
@@ -80,7 +194,7 @@ function App() {
 
   const handleJoinLobby = () => {
     if (playerName.trim()) {
-      socket.emit('join_lobby', { name: playerName.trim() });
+      socket.emit('join_lobby', { name: playerName.trim(), room_id: roomId });
     }
   };
 
@@ -96,24 +210,18 @@ function App() {
     socket.emit('night_action', { action, target });
   };
 
-  const handleVote = (target) => {
+  // GameCanvas calls onAction(action, target) in both phases
+  const handleVote = (action, target) => {
     socket.emit('vote', { target });
   };
 
-  const handleEndNight = () => {
-    socket.emit('end_night', {});
-  };
-
-  const handleEndDay = () => {
-    socket.emit('end_day', {});
-  };
-
   return (
     <div className="App">
       <header className="App-header">
         <h1>🎮 Mafia Game</h1>
         <div className="connection-status">
           Status: {isConnected ? '🟢 Connected' : '🔴 Disconnected'}
+          {roomId && <span> · Room: {roomId}</span>}
         </div>
       </header>
 
@@ -134,20 +242,20 @@ function App() {
               </button>
             </div>
 
-            {players.length < 7 && (
+            {players.length < capacity && (
               <button onClick={handleStartGameWithAI} className="start-button ai-button">
                 Play with AI
               </button>
             )}
 
-            {players.length >= 7 && (
+            {players.length >= capacity && (
               <button onClick={handleStartGame} className="start-button">
                 Start Game
               </button>
             )}
 
             <div className="players-list">
-              <h3>Players ({players.length}/7):</h3>
+              <h3>Players ({players.length}/{capacity}):</h3>
               <ul>
                 {players.map((player, index) => (
                   <li key={index}>{player.name}</li>
@@ -161,19 +269,20 @@ function App() {
               <div className="phase-info">
                 <h3>Current Phase: {currentPhase}</h3>
                 {myRole && <p>Your Role: {myRole}</p>}
+                {spectating && <p>Spectating</p>}
               </div>
 
-              {currentPhase === 'night' && (
+              {!spectating && currentPhase === 'night' && (
                 <div className="night-actions">
                   <h4>Night Actions</h4>
-                  <button onClick={handleEndNight}>End Night</button>
+                  <p>Night ends once everyone has acted or time runs out.</p>
                 </div>
               )}
 
-              {currentPhase === 'day' && (
+              {!spectating && currentPhase === 'day' && (
                 <div className="day-actions">
                   <h4>Day Phase - Vote to Eliminate</h4>
-                  <button onClick={handleEndDay}>End Day</button>
+                  <p>Day ends once everyone has voted or time runs out.</p>
                 </div>
               )}
             </div>
@@ -182,7 +291,7 @@ function App() {
               players={players}
               currentPhase={currentPhase}
               myRole={myRole}
-              onAction={currentPhase === 'night' ? handleNightAction : handleVote}
+              onAction={spectating ? () => {} : currentPhase === 'night' ? handleNightAction : handleVote}
             />
           </div>
         )}
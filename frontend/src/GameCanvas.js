@@ -70,9 +70,15 @@ const GameCanvas = ({ players, currentPhase, onAction, myRole }) => {
       this.players.clear(true, true);
       this.playerTexts.clear(true, true);
 
+      // Four to a row for a classic table, denser grids for big rosters
+      const columns = Math.max(4, Math.ceil(Math.sqrt(players.length)));
+      const rows = Math.ceil(players.length / columns);
+      const cellWidth = 600 / columns;
+      const cellHeight = Math.min(150, 400 / Math.max(rows, 1));
+
       players.forEach((player, index) => {
-        const x = 150 + (index % 4) * 150;
-        const y = 200 + Math.floor(index / 4) * 150;
+        const x = 100 + cellWidth / 2 + (index % columns) * cellWidth;
+        const y = 130 + cellHeight / 2 + Math.floor(index / columns) * cellHeight;
 
         const playerSprite = this.add.sprite(x, y, getPlayerSprite(player.role));
         playerSprite.setData('player', player);
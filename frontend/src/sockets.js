@@ -1,10 +1,15 @@
 import io from 'socket.io-client';
+import msgpackParser from 'socket.io-msgpack-parser';
+
+// Must match the server's MAFIA_WIRE_FORMAT; MessagePack frames are smaller
+// and cheaper to encode than JSON
+const wireFormat = process.env.REACT_APP_WIRE_FORMAT || 'json';
 
 const socket = io('http://localhost:8000', {
-  transports: ['websocket', 'polling'],
-  upgrade: true,
-  rememberUpgrade: true,
-  timeout: 20000
+  // Websocket only: long-polling would need sticky sessions across workers
+  transports: ['websocket'],
+  timeout: 20000,
+  ...(wireFormat === 'msgpack' ? { parser: msgpackParser } : {})
 });
 
 export default socket;